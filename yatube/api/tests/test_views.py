@@ -0,0 +1,202 @@
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Comment, Group, Post, User
+from api.views import PAGE_SIZE
+
+
+INDEX: str = 'api:index'
+GROUP_POSTS: str = 'api:group_posts'
+PROFILE: str = 'api:profile'
+POST_DETAIL: str = 'api:post_detail'
+POST_COMMENTS: str = 'api:post_comments'
+IMPORT_POSTS: str = 'api:import_posts'
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='Test group',
+            slug='test_slug',
+            description='Test description',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Test post'
+        )
+        self.comment = Comment.objects.create(
+            post=self.post, author=self.author, text='Test comment'
+        )
+        self.urls = {
+            INDEX: reverse(INDEX),
+            GROUP_POSTS: reverse(GROUP_POSTS,
+                                 kwargs={'slug': self.group.slug}),
+            PROFILE: reverse(PROFILE, kwargs={'username': self.author}),
+            POST_DETAIL: reverse(POST_DETAIL,
+                                 kwargs={'post_id': self.post.id}),
+            POST_COMMENTS: reverse(POST_COMMENTS,
+                                   kwargs={'post_id': self.post.id}),
+        }
+
+    def test_feeds(self):
+        """Ленты отдают посты в формате API."""
+        expected = {
+            'id': self.post.id,
+            'text': 'Test post',
+            'pub_date': self.post.pub_date.isoformat()[:23],
+            'author': 'test_user',
+            'group': {'slug': 'test_slug', 'title': 'Test group'},
+            'image': None,
+            'thumbnail': None,
+        }
+        for view in (INDEX, GROUP_POSTS, PROFILE):
+            with self.subTest(view=view):
+                data = self.client.get(self.urls[view]).json()
+                row = data['results'][0]
+                row['pub_date'] = row['pub_date'][:23]
+                self.assertEqual(data['results'], [expected])
+                self.assertIsNone(data['next'])
+
+    def test_post_detail_and_comments(self):
+        data = self.client.get(self.urls[POST_DETAIL]).json()
+        self.assertEqual(data['text'], 'Test post')
+        self.assertEqual(data['author_posts_count'], 1)
+        self.assertEqual(data['comments_count'], 1)
+        data = self.client.get(self.urls[POST_COMMENTS]).json()
+        self.assertEqual(
+            [(row['id'], row['author']) for row in data['results']],
+            [(self.comment.id, 'test_user')]
+        )
+
+    def test_unknown_objects(self):
+        urls = (
+            reverse(GROUP_POSTS, kwargs={'slug': 'missing'}),
+            reverse(PROFILE, kwargs={'username': 'missing'}),
+            reverse(POST_DETAIL, kwargs={'post_id': 0}),
+            reverse(POST_COMMENTS, kwargs={'post_id': 0}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {'detail': 'Не найдено.'})
+
+    def test_cursor_pagination(self):
+        """Лента листается по ссылке next до конца и обратно."""
+        for i in range(PAGE_SIZE):
+            Post.objects.create(author=self.author, text=f'Post #{i}')
+        first = self.client.get(self.urls[INDEX]).json()
+        self.assertEqual(len(first['results']), PAGE_SIZE)
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual(
+            [row['id'] for row in second['results']], [self.post.id]
+        )
+        self.assertIsNone(second['next'])
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+
+    def test_conditional_get(self):
+        """Неизмененная страница отдается ответом 304 без запросов."""
+        for view, url in self.urls.items():
+            with self.subTest(view=view):
+                response = self.client.get(url)
+                etag = response['ETag']
+                last_modified = response['Last-Modified']
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=last_modified
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_reset_etag(self):
+        """Изменение поста меняет ETag всех страниц с ним."""
+        etags = {
+            view: self.client.get(url)['ETag']
+            for view, url in self.urls.items()
+        }
+        Comment.objects.create(
+            post=self.post, author=self.author, text='New comment'
+        )
+        self.post.text = 'Edited post'
+        self.post.save()
+        for view, url in self.urls.items():
+            with self.subTest(view=view):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[view]
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_read_only(self):
+        response = self.client.post(self.urls[INDEX])
+        self.assertEqual(response.status_code, 405)
+
+
+class ImportPostsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff',
+                                             is_staff=True)
+        cls.author = User.objects.create_user(username='test_user')
+
+    def setUp(self):
+        self.url = reverse(IMPORT_POSTS)
+        self.body = '\n'.join(json.dumps(row) for row in (
+            {'author': 'test_user', 'text': 'First'},
+            {'author': 'missing', 'text': 'Second'},
+        ))
+
+    def post(self, client, **extra):
+        return client.post(self.url, self.body,
+                           content_type='application/x-ndjson', **extra)
+
+    def test_staff_can_import(self):
+        client = Client()
+        client.force_login(self.staff)
+        response = self.post(client)
+        self.assertEqual(response.json(), {
+            'created': 1,
+            'failed': 1,
+            'errors': [{'line': 2, 'error': 'Автор missing не найден.'}],
+        })
+        self.assertEqual(Post.objects.get().text, 'First')
+
+    @override_settings(POSTS_IMPORT_MAX_BYTES=10)
+    def test_large_body_is_rejected(self):
+        """Большой файл загружается командой, а не внутри запроса."""
+        client = Client()
+        client.force_login(self.staff)
+        response = self.post(client)
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('import_posts', response.json()['detail'])
+        self.assertFalse(Post.objects.exists())
+
+    def test_others_are_forbidden(self):
+        client = Client()
+        self.assertEqual(self.post(client).status_code, 403)
+        client.force_login(self.author)
+        self.assertEqual(self.post(client).status_code, 403)
+        self.assertEqual(client.get(self.url).status_code, 405)
+        self.assertFalse(Post.objects.exists())
+
+    def test_csrf_is_checked(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.staff)
+        self.assertEqual(self.post(client).status_code, 403)
+        token = 'a' * 64
+        client.cookies[settings.CSRF_COOKIE_NAME] = token
+        response = self.post(client, HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,214 @@
+"""
+JSON API для чтения лент, постов и комментариев.
+
+Строки выбираются через values() без создания объектов моделей, ленты
+листаются курсором, а ETag и Last-Modified берутся из поколений кэша
+лент (posts/feed_cache.py), поэтому повторный запрос неизмененной
+страницы получает 304 без обращения к базе.
+
+Запись одна: массовая загрузка постов в формате NDJSON для сотрудников
+(posts/importer.py).
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.utils.http import urlencode
+from django.views.decorators.http import require_POST, require_safe
+
+from posts import counters, importer
+from posts.feed_cache import (
+    POSTS, author_scope, feed_page, group_scope, post_author_scope,
+    post_scope,
+)
+from posts.models import Comment, Group, Post, User
+from posts.paginators import (
+    COMMENT_ORDERING, FEED_ORDERING, CursorPaginator,
+)
+
+
+PAGE_SIZE: int = 20
+
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'thumbnail',
+    'author__username', 'group__slug', 'group__title',
+)
+COMMENT_FIELDS = ('id', 'text', 'created', 'author__username')
+
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+def api_view(*scope_templates):
+    """
+    Только GET и HEAD, условный GET и кэш ответов по поколениям
+    областей scope_templates.
+    """
+    def decorator(view):
+        @require_safe
+        @feed_page(*scope_templates)
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=JSON_PARAMS)
+
+
+def not_found():
+    return json_response({'detail': 'Не найдено.'}, status=404)
+
+
+def serialize_post(row):
+    group = None
+    if row['group__slug'] is not None:
+        group = {'slug': row['group__slug'], 'title': row['group__title']}
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'],
+        'author': row['author__username'],
+        'group': group,
+        'image': default_storage.url(row['image']) if row['image'] else None,
+        'thumbnail': row['thumbnail'] or None,
+    }
+
+
+def serialize_comment(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'created': row['created'],
+        'author': row['author__username'],
+    }
+
+
+def page_response(request, rows, serialize, ordering=FEED_ORDERING):
+    """Страница rows по курсору ?after= или ?before= со ссылками."""
+    paginator = CursorPaginator(rows, PAGE_SIZE, ordering=ordering)
+    page = paginator.get_page(
+        request.GET.get('after'), request.GET.get('before')
+    )
+    links = {}
+    for name, param, cursor in (('next', 'after', page.next_cursor),
+                                ('previous', 'before',
+                                 page.previous_cursor)):
+        links[name] = (
+            f'{request.path}?{urlencode({param: cursor})}'
+            if cursor else None
+        )
+    return json_response({
+        'results': [serialize(row) for row in page],
+        **links,
+    })
+
+
+@api_view(POSTS)
+def index(request):
+    return page_response(
+        request, Post.objects.values(*POST_FIELDS), serialize_post
+    )
+
+
+@api_view(group_scope('{slug}'))
+def group_posts(request, slug):
+    group_id = (
+        Group.objects.filter(slug=slug).values_list('id', flat=True).first()
+    )
+    if group_id is None:
+        return not_found()
+    return page_response(
+        request,
+        Post.objects.filter(group_id=group_id).values(*POST_FIELDS),
+        serialize_post,
+    )
+
+
+@api_view(author_scope('{username}'))
+def profile(request, username):
+    author_id = (
+        User.objects.filter(username=username)
+        .values_list('id', flat=True).first()
+    )
+    if author_id is None:
+        return not_found()
+    return page_response(
+        request,
+        Post.objects.filter(author_id=author_id).values(*POST_FIELDS),
+        serialize_post,
+    )
+
+
+@api_view(post_scope('{post_id}'), post_author_scope)
+def post_detail(request, post_id):
+    row = (
+        Post.objects.filter(pk=post_id)
+        .annotate(
+            author_posts_count=counters.count_subquery(
+                counters.author_posts_key, 'author_id'
+            ),
+            comments_count=counters.count_subquery(
+                counters.post_comments_key, 'id'
+            ),
+        )
+        .values(*POST_FIELDS, 'author_id', 'author_posts_count',
+                'comments_count')
+        .first()
+    )
+    if row is None:
+        return not_found()
+    data = serialize_post(row)
+    for name, make_key, object_id in (
+            ('author_posts_count', counters.author_posts_key,
+             row['author_id']),
+            ('comments_count', counters.post_comments_key, row['id'])):
+        data[name] = row[name]
+        if data[name] is None:
+            data[name] = counters.get_count(make_key(object_id))
+    return json_response(data)
+
+
+@api_view(post_scope('{post_id}'))
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return not_found()
+    return page_response(
+        request,
+        Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS),
+        serialize_comment,
+        ordering=COMMENT_ORDERING,
+    )
+
+
+@require_POST
+def import_posts(request):
+    """
+    Загружает посты из тела запроса в формате NDJSON. Тело читается
+    построчно из потока, но загрузка идет внутри запроса, поэтому тело
+    ограничено POSTS_IMPORT_MAX_BYTES; большие файлы загружает команда
+    import_posts. Доступно сотрудникам; CSRF проверяется как для любого
+    запроса с сессией.
+    """
+    if not request.user.is_staff:
+        return json_response(
+            {'detail': 'Нужны права сотрудника.'}, status=403
+        )
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > settings.POSTS_IMPORT_MAX_BYTES:
+        return json_response({
+            'detail': (
+                'Тело запроса больше '
+                f'{settings.POSTS_IMPORT_MAX_BYTES} байт: большие файлы '
+                'загружает команда import_posts.'
+            ),
+        }, status=413)
+    result = importer.import_posts(
+        request, create_authors=request.GET.get('create_authors') == '1'
+    )
+    return json_response(result.as_dict())
@@ -0,0 +1,105 @@
+"""
+PostgreSQL с пулом соединений внутри процесса.
+
+Django 2.2 открывает соединение на поток и закрывает его в конце запроса
+или держит CONN_MAX_AGE секунд за этим потоком. Этот бэкенд берет
+соединения из общего для процесса psycopg2 ThreadedConnectionPool и в
+конце запроса возвращает их обратно, так что потоки воркера делят не
+больше POOL_SIZE соединений и не платят за подключение на каждый запрос.
+Если свободных соединений нет, поток ждет до POOL_TIMEOUT секунд.
+
+Включается через yatube/env.py: database_config(..., pool_size=N).
+"""
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from psycopg2 import extensions, pool
+
+
+class PoolTimeout(base.Database.OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """ThreadedConnectionPool, в котором getconn ждет, а не падает."""
+
+    def __init__(self, size, timeout, conn_params):
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._pool = pool.ThreadedConnectionPool(0, size, **conn_params)
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(
+                f'Нет свободных соединений в пуле за {self.timeout} с'
+            )
+        try:
+            return self._pool.getconn()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, connection, close=False):
+        try:
+            self._pool.putconn(connection, close=close)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(settings_dict, conn_params):
+    """Пул процесса для параметров подключения conn_params."""
+    key = tuple(sorted((name, str(value))
+                       for name, value in conn_params.items()))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                settings_dict['POOL_SIZE'],
+                settings_dict.get('POOL_TIMEOUT', 10),
+                conn_params,
+            )
+        return _pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        if self.settings_dict.get('POOL_SIZE', 0) < 1:
+            raise ImproperlyConfigured(
+                'Для пула соединений нужен POOL_SIZE не меньше 1.'
+            )
+        return super().get_connection_params()
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.settings_dict, conn_params)
+        connection = self.pool.getconn()
+        # То же, что делает базовый бэкенд после подключения.
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level
+        )
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        """Возвращает соединение в пул вместо того, чтобы закрыть его."""
+        if self.connection is None:
+            return
+        connection = self.connection
+        broken = bool(connection.closed)
+        if not broken and connection.get_transaction_status() != (
+                extensions.TRANSACTION_STATUS_IDLE):
+            # Незавершенная транзакция не должна достаться другому потоку.
+            try:
+                connection.rollback()
+            except base.Database.Error:
+                broken = True
+        with self.wrap_database_errors:
+            self.pool.putconn(connection, close=broken)
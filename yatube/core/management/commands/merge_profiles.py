@@ -0,0 +1,56 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводит профили запросов (collapsed stacks) из PROFILING_DIR в '
+        'один файл для flamegraph.pl или speedscope.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', default=None,
+            help='Каталог профилей, по умолчанию PROFILING_DIR.',
+        )
+        parser.add_argument(
+            '--hours', type=int, default=None,
+            help='Только профили последних N часов: текущего и N - 1 '
+                 'предыдущих.',
+        )
+        parser.add_argument(
+            '--view', help='Только view, в имени которых есть строка.',
+        )
+        parser.add_argument(
+            '--min-ms', type=int, default=0,
+            help='Только запросы не быстрее стольких миллисекунд.',
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл результата; «-» — стандартный вывод.',
+        )
+
+    def handle(self, *args, **options):
+        stacks = Counter()
+        profiles = 0
+        for path in profiling.iter_profiles(
+                options['dir'] or settings.PROFILING_DIR,
+                hours=options['hours'],
+                view=options['view'],
+                min_ms=options['min_ms']):
+            stacks.update(profiling.read_profile(path))
+            profiles += 1
+        lines = (f'{stack} {count}\n' for stack, count in sorted(
+            stacks.items()))
+        if options['output'] == '-':
+            self.stdout.write(''.join(lines), ending='')
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.writelines(lines)
+        self.stderr.write(
+            f'Профилей: {profiles}, разных стеков: {len(stacks)}'
+        )
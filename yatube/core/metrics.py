@@ -0,0 +1,287 @@
+"""
+Метрики производительности запросов.
+
+MetricsMiddleware (core/middleware.py) заводит на время запроса сборщик
+RequestMetrics: в него попадают число и время запросов к базе, время
+отрисовки шаблонов, попадания в кэш и промахи, время подготовки
+миниатюр. По итогам запроса сборщик отдается в заголовок Server-Timing и
+в гистограммы процесса, которые /metrics/ выводит в текстовом формате
+Prometheus.
+
+Гистограммы живут в памяти процесса и не делятся между воркерами, так
+что собирать их нужно с каждого процесса. Метки ограничены именами
+view, поэтому число рядов не растет с числом адресов.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+UNRESOLVED_VIEW: str = '<unresolved>'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+         .replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"'
+                          for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Метрика с метками label_names; значения хранятся по меткам."""
+
+    kind = None
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = Lock()
+
+    def _labels(self, labels):
+        return tuple((name, labels[name]) for name in self.label_names)
+
+    def samples(self):
+        """Строки (имя, метки, значение) для вывода."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        for name, labels, value in self.samples():
+            lines.append(
+                f'{name}{_format_labels(labels)} {_format_value(value)}'
+            )
+        return lines
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class CounterMetric(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._labels(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            yield f'{self.name}_total', labels, value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, label_names=(),
+                 buckets=DURATION_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._labels(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # Счетчики корзин, сумма и число наблюдений.
+                state = self.values[key] = [[0] * len(self.buckets), 0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self.lock:
+            values = sorted(
+                (labels, (list(counts), total, count))
+                for labels, (counts, total, count) in self.values.items()
+            )
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield (f'{self.name}_bucket',
+                       (*labels, ('le', _format_value(float(bound)))),
+                       cumulative)
+            yield f'{self.name}_bucket', (*labels, ('le', '+Inf')), count
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+REQUESTS = CounterMetric(
+    'yatube_requests',
+    'Обработанные запросы.',
+    ('view', 'method', 'status'),
+)
+REQUEST_SECONDS = Histogram(
+    'yatube_request_duration_seconds',
+    'Время обработки запроса.',
+    ('view',),
+)
+DB_QUERIES = Histogram(
+    'yatube_db_queries_per_request',
+    'Число запросов к базе за запрос.',
+    ('view',),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+DB_SECONDS = Histogram(
+    'yatube_db_duration_seconds',
+    'Время запросов к базе за запрос.',
+    ('view',),
+)
+TEMPLATE_SECONDS = Histogram(
+    'yatube_template_duration_seconds',
+    'Время отрисовки шаблонов за запрос.',
+    ('view',),
+)
+CACHE_REQUESTS = CounterMetric(
+    'yatube_cache_requests',
+    'Обращения к кэшу страниц и фрагментов лент.',
+    ('kind', 'result'),
+)
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_duration_seconds',
+    'Время подготовки миниатюры и вариантов картинки поста.',
+)
+
+REGISTRY = (
+    REQUESTS, REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, TEMPLATE_SECONDS,
+    CACHE_REQUESTS, THUMBNAIL_SECONDS,
+)
+
+
+class RequestMetrics:
+    """Сборщик метрик одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.timings = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add_time(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        """Обертка для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.add_time('db', time.perf_counter() - started)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        """Значение заголовка Server-Timing, длительности в мс."""
+        entries = [f'total;dur={total * 1000:.1f}']
+        entries.append(
+            f'db;dur={self.timings.get("db", 0.0) * 1000:.1f};'
+            f'desc="{self.db_queries} queries"'
+        )
+        for name in ('template', 'thumbnail'):
+            if name in self.timings:
+                entries.append(
+                    f'{name};dur={self.timings[name] * 1000:.1f}'
+                )
+        if self.cache_hits or self.cache_misses:
+            entries.append(
+                f'cache;desc="hits {self.cache_hits} '
+                f'misses {self.cache_misses}"'
+            )
+        return ', '.join(entries)
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def start_request():
+    """Заводит сборщик для текущего запроса; вернуть токен end_request."""
+    collector = RequestMetrics()
+    return collector, _current.set(collector)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def timed(name, histogram=None):
+    """
+    Засекает время блока: оно прибавляется к таймингу name текущего
+    запроса и попадает в histogram, если она задана.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        collector = _current.get()
+        if collector is not None:
+            collector.add_time(name, elapsed)
+        if histogram is not None:
+            histogram.observe(elapsed)
+
+
+def count_cache(kind, hit):
+    """Учитывает обращение к кэшу kind: попадание или промах."""
+    CACHE_REQUESTS.inc(kind=kind, result='hit' if hit else 'miss')
+    collector = _current.get()
+    if collector is not None:
+        if hit:
+            collector.cache_hits += 1
+        else:
+            collector.cache_misses += 1
+
+
+def record_request(view, method, status, total, collector):
+    REQUESTS.inc(view=view, method=method, status=status)
+    REQUEST_SECONDS.observe(total, view=view)
+    DB_QUERIES.observe(collector.db_queries, view=view)
+    DB_SECONDS.observe(collector.timings.get('db', 0.0), view=view)
+    if 'template' in collector.timings:
+        TEMPLATE_SECONDS.observe(collector.timings['template'], view=view)
+
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def clear():
+    """Сбрасывает все метрики процесса."""
+    for metric in REGISTRY:
+        metric.clear()
@@ -0,0 +1,79 @@
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from . import metrics, profiling, querywatch
+
+
+class MetricsMiddleware:
+    """
+    Замеряет запрос: полное время, число и время запросов к базе,
+    отрисовку шаблонов, кэш и миниатюры (см. core/metrics.py).
+    Итоги пишутся в гистограммы процесса и в заголовок Server-Timing.
+    Стоит первым в MIDDLEWARE, чтобы учитывать всю обработку.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        collector, token = metrics.start_request()
+        try:
+            with connection.execute_wrapper(collector.db_wrapper):
+                response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        total = collector.elapsed()
+        match = request.resolver_match
+        view = match.view_name if match else metrics.UNRESOLVED_VIEW
+        metrics.record_request(
+            view, request.method, response.status_code, total, collector
+        )
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = collector.server_timing(total)
+        return response
+
+
+class QueryWatchMiddleware:
+    """
+    Ищет в каждом запросе медленные запросы к базе и N+1
+    (см. core/querywatch.py) в режиме QUERYWATCH_MODE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with querywatch.watch():
+            return self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует выбранные запросы к view из PROFILING_NAMESPACES
+    (см. core/profiling.py). Остальные запросы проходят без сэмплера.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        sampler = getattr(request, '_stack_sampler', None)
+        if sampler is not None:
+            stacks = sampler.stop()
+            name = profiling.save_profile(
+                stacks, request.resolver_match.view_name, sampler.elapsed
+            )
+            if name is not None:
+                response[profiling.PROFILE_ID_HEADER] = name
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if profiling.should_profile(request):
+            request._stack_sampler = profiling.StackSampler(
+                threading.get_ident(), settings.PROFILING_INTERVAL
+            ).start()
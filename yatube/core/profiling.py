@@ -0,0 +1,196 @@
+"""
+Выборочное профилирование запросов.
+
+ProfilingMiddleware (core/middleware.py) профилирует запрос к view из
+PROFILING_NAMESPACES, если в нем есть заголовок X-Yatube-Profile с
+токеном PROFILING_TOKEN или если запрос попал в долю
+PROFILING_SAMPLE_RATE. Пока такой запрос
+обрабатывается, поток StackSampler раз в PROFILING_INTERVAL секунд
+снимает стек потока запроса через sys._current_frames() и считает
+одинаковые стеки. Сам запрос не замедляется трассировкой, как под
+cProfile, а запросы без профиля платят одной проверкой.
+
+Профиль сохраняется в формате collapsed stacks («кадр;кадр;кадр N»),
+который понимают flamegraph.pl и speedscope, в каталог текущего часа
+внутри PROFILING_DIR; каталоги старше PROFILING_KEEP_HOURS удаляются.
+Команда merge_profiles сводит профили в один файл.
+"""
+import logging
+import os
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+
+
+PROFILE_HEADER: str = 'HTTP_X_YATUBE_PROFILE'
+PROFILE_ID_HEADER: str = 'X-Yatube-Profile-Id'
+PROFILE_SUFFIX: str = '.collapsed'
+HOUR_FORMAT: str = '%Y%m%d-%H'
+# Имя файла профиля: время, view, длительность запроса и случайный хвост.
+PROFILE_NAME_RE = re.compile(
+    r'^\d{6}-(?P<view>.+)-(?P<ms>\d+)ms-[0-9a-f]{8}\.collapsed$'
+)
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=4096)
+def frame_name(code):
+    """Имя кадра: путь относительно проекта или site-packages и функция."""
+    filename = code.co_filename
+    for prefix in (settings.BASE_DIR, *sys.path):
+        if prefix and filename.startswith(os.path.join(prefix, '')):
+            filename = os.path.relpath(filename, prefix)
+            break
+    return f'{filename}:{code.co_name}'.replace(';', ':')
+
+
+def collapse(frame):
+    """Стек кадра от корня: «кадр;кадр;кадр»."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Поток, который снимает стек потока thread_id раз в interval."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='stack-sampler', daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self.stacks
+
+
+def should_profile(request):
+    match = request.resolver_match
+    if match is None or match.namespace not in settings.PROFILING_NAMESPACES:
+        return False
+    token = request.META.get(PROFILE_HEADER)
+    if token and settings.PROFILING_TOKEN:
+        return constant_time_compare(token, settings.PROFILING_TOKEN)
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def rotate(profile_dir, now):
+    """Удаляет каталоги часов старше PROFILING_KEEP_HOURS."""
+    oldest = (now - timedelta(hours=settings.PROFILING_KEEP_HOURS)).strftime(
+        HOUR_FORMAT
+    )
+    for name in os.listdir(profile_dir):
+        path = os.path.join(profile_dir, name)
+        if name < oldest and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def save_profile(stacks, view_name, elapsed):
+    """
+    Пишет профиль в каталог текущего часа и возвращает имя файла или
+    None, если записать не удалось: профиль не должен ронять запрос.
+    """
+    now = datetime.now()
+    hour_dir = os.path.join(settings.PROFILING_DIR, now.strftime(HOUR_FORMAT))
+    name = (
+        f'{now:%H%M%S}-{view_name.replace(":", ".")}-'
+        f'{elapsed * 1000:.0f}ms-{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}'
+    )
+    try:
+        if not os.path.isdir(hour_dir):
+            os.makedirs(hour_dir, exist_ok=True)
+            rotate(settings.PROFILING_DIR, now)
+        path = os.path.join(hour_dir, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in stacks.most_common():
+                file.write(f'{stack} {count}\n')
+    except OSError:
+        logger.exception('Не удалось сохранить профиль %s', name)
+        return None
+    return name
+
+
+def read_profile(path):
+    """Стеки профиля в Counter."""
+    stacks = Counter()
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+
+def parse_hour(name):
+    """Час каталога профилей или None, если имя не в HOUR_FORMAT."""
+    try:
+        return datetime.strptime(name, HOUR_FORMAT)
+    except ValueError:
+        return None
+
+
+def iter_profiles(profile_dir, hours=None, view=None, min_ms=0, now=None):
+    """
+    Пути профилей из каталогов последних hours часов до now (всех, если
+    hours None): текущий час и hours - 1 предыдущих. Берутся профили с
+    view, содержащим строку view, и запросом не короче min_ms.
+    """
+    if not os.path.isdir(profile_dir):
+        return
+    hour_dirs = sorted(
+        name for name in os.listdir(profile_dir)
+        if os.path.isdir(os.path.join(profile_dir, name))
+        and parse_hour(name) is not None
+    )
+    if hours is not None:
+        now = now or datetime.now()
+        oldest = (now - timedelta(hours=hours - 1)).replace(
+            minute=0, second=0, microsecond=0
+        )
+        hour_dirs = [
+            name for name in hour_dirs
+            if hours > 0 and parse_hour(name) >= oldest
+        ]
+    for hour_dir in hour_dirs:
+        path = os.path.join(profile_dir, hour_dir)
+        for name in sorted(os.listdir(path)):
+            match = PROFILE_NAME_RE.match(name)
+            if match is None:
+                continue
+            if view and view not in match['view']:
+                continue
+            if int(match['ms']) < min_ms:
+                continue
+            yield os.path.join(path, name)
@@ -0,0 +1,133 @@
+"""
+Поиск медленных запросов и запросов N+1.
+
+QueryWatcher подключается к соединению через connection.execute_wrapper
+и сводит каждый запрос к отпечатку: без значений, с одним местом под
+любой список IN (...). Если запрос одной формы выполняется за время
+наблюдения QUERYWATCH_REPEAT_THRESHOLD раз, это вероятный N+1: чаще
+всего шаблон или цикл обходит связанные объекты по одному. Запросы
+дольше QUERYWATCH_SLOW_QUERY_MS записываются в журнал. В обоих случаях
+указывается место в коде проекта, откуда пришел запрос.
+
+QUERYWATCH_MODE: 'off' — не следить, 'log' — писать в журнал
+core.querywatch (для staging), 'raise' — бросать QueryWatchError на
+N+1 (для тестов). QueryWatchMiddleware следит за каждым запросом.
+Запросы, в тексте которых есть строка из QUERYWATCH_IGNORE, за N+1 не
+считаются.
+"""
+import logging
+import os
+import re
+import time
+import traceback
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+OFF: str = 'off'
+LOG: str = 'log'
+RAISE: str = 'raise'
+MODES = (OFF, LOG, RAISE)
+
+# Повторяются законно только управляющие транзакцией команды.
+WATCHED_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+# Обертки соединения из core: место запроса ищется за их пределами.
+CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+INSTRUMENTATION_FILES = {
+    os.path.join(CORE_DIR, name)
+    for name in ('querywatch.py', 'metrics.py', 'middleware.py')
+}
+
+
+class QueryWatchError(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """Форма запроса: без значений и с одним местом под список IN."""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def query_location():
+    """Ближайший к запросу кадр стека из кода проекта."""
+    base_dir = os.path.join(settings.BASE_DIR, '')
+    for frame in reversed(traceback.extract_stack()):
+        if (frame.filename.startswith(base_dir)
+                and frame.filename not in INSTRUMENTATION_FILES
+                and 'site-packages' not in frame.filename):
+            return (
+                f'{os.path.relpath(frame.filename, settings.BASE_DIR)}:'
+                f'{frame.lineno} in {frame.name}'
+            )
+    return 'неизвестно'
+
+
+class QueryWatcher:
+    """Обертка execute_wrapper, которая следит за запросами."""
+
+    def __init__(self, mode=None, repeat_threshold=None,
+                 slow_query_ms=None):
+        self.mode = mode or settings.QUERYWATCH_MODE
+        self.repeat_threshold = (
+            repeat_threshold or settings.QUERYWATCH_REPEAT_THRESHOLD
+        )
+        self.slow_query_ms = (
+            slow_query_ms if slow_query_ms is not None
+            else settings.QUERYWATCH_SLOW_QUERY_MS
+        )
+        self.counts = {}
+        self.repeated = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        self.check(sql, (time.perf_counter() - started) * 1000)
+        return result
+
+    def check(self, sql, elapsed_ms):
+        if elapsed_ms >= self.slow_query_ms:
+            logger.warning(
+                'Медленный запрос, %.1f мс, %s: %s',
+                elapsed_ms, query_location(), sql,
+            )
+        if (not sql.lstrip().upper().startswith(WATCHED_STATEMENTS)
+                or any(part in sql for part in settings.QUERYWATCH_IGNORE)):
+            return
+        shape = fingerprint(sql)
+        count = self.counts.get(shape, 0) + 1
+        self.counts[shape] = count
+        if count != self.repeat_threshold:
+            return
+        self.repeated.append(shape)
+        message = (
+            f'Вероятный N+1: запрос одной формы выполнен '
+            f'{count} раз, {query_location()}: {shape}'
+        )
+        if self.mode == RAISE:
+            raise QueryWatchError(message)
+        logger.warning(message)
+
+
+@contextmanager
+def watch(mode=None, **options):
+    """Следит за запросами блока; отдает QueryWatcher."""
+    watcher = QueryWatcher(mode, **options)
+    if watcher.mode == OFF:
+        yield watcher
+        return
+    with connection.execute_wrapper(watcher):
+        yield watcher
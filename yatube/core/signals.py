@@ -0,0 +1,28 @@
+"""
+Настройка соединений SQLite под одновременную запись.
+
+В режиме журнала по умолчанию запись блокирует и читателей, а второй
+писатель сразу получает «database is locked». С WAL читатели не ждут
+писателя, synchronous=NORMAL не сбрасывает журнал на диск при каждом
+коммите, busy_timeout заставляет писателя подождать, пока освободится
+блокировка, а mmap_size читает файл базы через отображение в память.
+PRAGMA берутся из SQLITE_PRAGMAS и выполняются на каждом новом
+соединении.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    in_memory = connection.is_in_memory_db()
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        # База в памяти не умеет WAL, ее журнал всегда в памяти.
+        if name == 'journal_mode' and in_memory:
+            continue
+        # Напрямую через sqlite3: служебные команды не должны попадать
+        # в счетчики запросов метрик и querywatch.
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,31 @@
+from django.template.backends.django import DjangoTemplates
+
+from . import metrics
+
+
+class InstrumentedTemplate:
+    """Шаблон, время отрисовки которого попадает в метрики запроса."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with metrics.timed('template'):
+            return self.template.render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    Бэкенд DjangoTemplates, который замеряет отрисовку шаблонов,
+    полученных через него. Вложенные {% include %} и {% extends %}
+    идут мимо бэкенда и входят во время внешнего шаблона.
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name))
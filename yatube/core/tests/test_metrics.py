@@ -0,0 +1,90 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from core import metrics
+from posts.models import Post, User
+
+
+INDEX_URL: str = reverse('posts:index')
+METRICS_URL: str = reverse('metrics')
+
+
+class HistogramTests(TestCase):
+    def test_render(self):
+        histogram = metrics.Histogram(
+            'test_seconds', 'Test.', ('view',), buckets=(0.1, 1.0)
+        )
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, view='index')
+        self.assertEqual(histogram.render(), [
+            '# HELP test_seconds Test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{view="index",le="0.1"} 1',
+            'test_seconds_bucket{view="index",le="1.0"} 2',
+            'test_seconds_bucket{view="index",le="+Inf"} 3',
+            'test_seconds_sum{view="index"} 5.55',
+            'test_seconds_count{view="index"} 3',
+        ])
+
+    def test_label_escaping(self):
+        counter = metrics.CounterMetric('test', 'Test.', ('view',))
+        counter.inc(view='a"b\\c')
+        self.assertEqual(counter.render()[-1],
+                         'test_total{view="a\\"b\\\\c"} 1')
+
+
+class MetricsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        cls.staff = User.objects.create_user(username='staff',
+                                             is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        metrics.clear()
+        self.guest_user = Client()
+        Post.objects.create(author=self.author, text='Test post')
+
+    def server_timing(self, response):
+        return dict(
+            entry.split(';', 1) for entry in
+            response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing(self):
+        timing = self.server_timing(self.guest_user.get(INDEX_URL))
+        self.assertEqual(
+            set(timing), {'total', 'db', 'template', 'cache'}
+        )
+        self.assertTrue(timing['cache'].startswith('desc="hits 0 '))
+        timing = self.server_timing(self.guest_user.get(INDEX_URL))
+        self.assertEqual(timing['cache'], 'desc="hits 1 misses 0"')
+        self.assertTrue(timing['db'].endswith('desc="0 queries"'))
+        self.assertNotIn('template', timing)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        response = self.guest_user.get(INDEX_URL)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_metrics_endpoint(self):
+        self.guest_user.get(INDEX_URL)
+        self.guest_user.get(INDEX_URL)
+        response = self.guest_user.get(METRICS_URL)
+        self.assertEqual(response.status_code, 302)
+        staff_client = Client()
+        staff_client.force_login(self.staff)
+        response = staff_client.get(METRICS_URL)
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        for line in (
+            'yatube_requests_total{view="posts:index",method="GET",'
+            'status="200"} 2',
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            'yatube_cache_requests_total{kind="page",result="hit"} 1',
+            'yatube_cache_requests_total{kind="page",result="miss"} 1',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, body)
@@ -0,0 +1,137 @@
+from unittest import mock, skipUnless
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+try:
+    from psycopg2 import extensions
+    from core.backends.postgresql_pool import base as pool_backend
+except ImportError:
+    pool_backend = None
+
+
+class FakeConnection:
+    """Соединение psycopg2 без сервера: только то, что трогает бэкенд."""
+
+    def __init__(self, status=None, closed=0, rollback_error=None):
+        self.status = (
+            extensions.TRANSACTION_STATUS_IDLE if status is None else status
+        )
+        self.closed = closed
+        self.rollback_error = rollback_error
+        self.rolled_back = False
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        if self.rollback_error:
+            raise self.rollback_error
+        self.rolled_back = True
+
+
+class FakeThreadedPool:
+    """Замена ThreadedConnectionPool, которая помнит возвраты."""
+
+    def __init__(self, minconn, maxconn, **conn_params):
+        self.error = None
+        self.returned = []
+        self.closed = False
+
+    def getconn(self):
+        if self.error:
+            raise self.error
+        return FakeConnection()
+
+    def putconn(self, connection, close=False):
+        self.returned.append((connection, close))
+
+    def closeall(self):
+        self.closed = True
+
+
+@skipUnless(pool_backend, 'psycopg2 не установлен')
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(
+            pool_backend.pool, 'ThreadedConnectionPool', FakeThreadedPool
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = pool_backend.ConnectionPool(1, 0.01, {})
+
+    def test_checkout_and_return(self):
+        """Пока соединение выдано, второе ждет и получает PoolTimeout."""
+        connection = self.pool.getconn()
+        with self.assertRaises(pool_backend.PoolTimeout):
+            self.pool.getconn()
+        self.pool.putconn(connection)
+        self.assertEqual(self.pool._pool.returned, [(connection, False)])
+        self.assertIsInstance(self.pool.getconn(), FakeConnection)
+
+    def test_failed_checkout_frees_slot(self):
+        """Ошибка подключения не занимает место в пуле."""
+        self.pool._pool.error = pool_backend.base.Database.OperationalError()
+        with self.assertRaises(pool_backend.base.Database.OperationalError):
+            self.pool.getconn()
+        self.pool._pool.error = None
+        self.assertIsInstance(self.pool.getconn(), FakeConnection)
+
+    def test_closeall(self):
+        self.pool.closeall()
+        self.assertTrue(self.pool._pool.closed)
+
+
+@skipUnless(pool_backend, 'psycopg2 не установлен')
+class PooledDatabaseWrapperTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(
+            pool_backend.pool, 'ThreadedConnectionPool', FakeThreadedPool
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.wrapper = self.make_wrapper(POOL_SIZE=1)
+        self.wrapper.pool = pool_backend.ConnectionPool(1, 0.01, {})
+
+    @staticmethod
+    def make_wrapper(**settings):
+        return pool_backend.DatabaseWrapper({
+            'ENGINE': 'core.backends.postgresql_pool',
+            'NAME': 'yatube', 'USER': '', 'PASSWORD': '', 'HOST': '',
+            'PORT': '', 'OPTIONS': {}, 'TIME_ZONE': None,
+            'CONN_MAX_AGE': 0, 'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False,
+            **settings,
+        })
+
+    def close(self, connection):
+        self.wrapper.pool._slots.acquire()
+        self.wrapper.connection = connection
+        self.wrapper._close()
+        return self.wrapper.pool._pool.returned
+
+    def test_idle_connection_is_returned(self):
+        connection = FakeConnection()
+        self.assertEqual(self.close(connection), [(connection, False)])
+        self.assertFalse(connection.rolled_back)
+
+    def test_open_transaction_is_rolled_back(self):
+        """Соединение с незавершенной транзакцией откатывается."""
+        connection = FakeConnection(
+            status=extensions.TRANSACTION_STATUS_INERROR
+        )
+        self.assertEqual(self.close(connection), [(connection, False)])
+        self.assertTrue(connection.rolled_back)
+
+    def test_broken_connection_is_closed(self):
+        """Сломанное соединение пул закрывает, а не выдает снова."""
+        closed = FakeConnection(closed=2)
+        self.assertEqual(self.close(closed), [(closed, True)])
+        self.wrapper.pool._pool.returned.clear()
+        failed = FakeConnection(
+            status=extensions.TRANSACTION_STATUS_INTRANS,
+            rollback_error=pool_backend.base.Database.OperationalError(),
+        )
+        self.assertEqual(self.close(failed), [(failed, True)])
+
+    def test_pool_size_is_required(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.make_wrapper(POOL_SIZE=0).get_connection_params()
@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from core import profiling
+
+
+TEMP_PROFILING_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TOKEN: str = 'secret'
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+@override_settings(PROFILING_DIR=TEMP_PROFILING_DIR, PROFILING_TOKEN=TOKEN,
+                   PROFILING_INTERVAL=0.001)
+class ProfilingTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PROFILING_DIR, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(TEMP_PROFILING_DIR, ignore_errors=True)
+        os.makedirs(TEMP_PROFILING_DIR)
+        self.client = Client()
+
+    def profile_files(self):
+        return list(profiling.iter_profiles(TEMP_PROFILING_DIR))
+
+    def test_sampler_collects_stacks(self):
+        sampler = profiling.StackSampler(
+            threading.get_ident(), 0.001
+        ).start()
+        busy_wait(0.05)
+        stacks = sampler.stop()
+        self.assertTrue(stacks)
+        stack = stacks.most_common(1)[0][0]
+        self.assertIn('core/tests/test_profiling.py:busy_wait', stack)
+        self.assertTrue(
+            stack.index('test_sampler_collects_stacks')
+            < stack.index('busy_wait')
+        )
+
+    def test_token_header_triggers_profile(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header(profiling.PROFILE_ID_HEADER))
+        response = self.client.get(reverse('posts:index'),
+                                   HTTP_X_YATUBE_PROFILE='wrong')
+        self.assertFalse(response.has_header(profiling.PROFILE_ID_HEADER))
+        self.assertEqual(self.profile_files(), [])
+        response = self.client.get(reverse('posts:index'),
+                                   HTTP_X_YATUBE_PROFILE=TOKEN)
+        name = response[profiling.PROFILE_ID_HEADER]
+        self.assertIn('-posts.index-', name)
+        self.assertEqual(
+            [os.path.basename(path) for path in self.profile_files()],
+            [name]
+        )
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sample_rate_and_namespaces(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('api:index'))
+        self.client.get(reverse('about:author'))
+        self.assertEqual(len(self.profile_files()), 1)
+
+    def test_old_hours_are_rotated(self):
+        now = datetime.now()
+        old = now - timedelta(hours=settings.PROFILING_KEEP_HOURS + 1)
+        os.makedirs(os.path.join(TEMP_PROFILING_DIR,
+                                 old.strftime(profiling.HOUR_FORMAT)))
+        profiling.save_profile(profiling.Counter({'a;b': 1}),
+                               'posts:index', 0.01)
+        self.assertEqual(os.listdir(TEMP_PROFILING_DIR),
+                         [now.strftime(profiling.HOUR_FORMAT)])
+
+    def test_hours_count_from_now(self):
+        """--hours отсчитывается от текущего часа, а не по каталогам."""
+        now = datetime(2024, 5, 10, 15, 30)
+        hour_names = {
+            hours_ago: (now - timedelta(hours=hours_ago)).strftime(
+                profiling.HOUR_FORMAT)
+            for hours_ago in (0, 1, 30)
+        }
+        for name in hour_names.values():
+            os.makedirs(os.path.join(TEMP_PROFILING_DIR, name))
+            profile = '000000-posts.index-5ms-0000abcd.collapsed'
+            open(os.path.join(TEMP_PROFILING_DIR, name, profile), 'w').close()
+        cases = {1: [0], 2: [0, 1], 24: [0, 1], 0: []}
+        for hours, expected in cases.items():
+            with self.subTest(hours=hours):
+                paths = profiling.iter_profiles(
+                    TEMP_PROFILING_DIR, hours=hours, now=now
+                )
+                self.assertEqual(
+                    sorted(os.path.basename(os.path.dirname(path))
+                           for path in paths),
+                    sorted(hour_names[hours_ago] for hours_ago in expected),
+                )
+
+    def test_merge(self):
+        for stacks, view, elapsed in (
+                ({'a;b': 2, 'a;c': 1}, 'posts:index', 0.5),
+                ({'a;b': 3}, 'posts:profile', 0.01)):
+            profiling.save_profile(profiling.Counter(stacks), view, elapsed)
+        out = StringIO()
+        call_command('merge_profiles', dir=TEMP_PROFILING_DIR,
+                     stdout=out, stderr=StringIO())
+        self.assertEqual(out.getvalue(), 'a;b 5\na;c 1\n')
+        out = StringIO()
+        call_command('merge_profiles', dir=TEMP_PROFILING_DIR,
+                     min_ms=100, stdout=out, stderr=StringIO())
+        self.assertEqual(out.getvalue(), 'a;b 2\na;c 1\n')
+        out = StringIO()
+        call_command('merge_profiles', dir=TEMP_PROFILING_DIR,
+                     view='profile', stdout=out, stderr=StringIO())
+        self.assertEqual(out.getvalue(), 'a;b 3\n')
@@ -0,0 +1,68 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from core import querywatch
+from posts.models import Post, User
+
+
+class FingerprintTests(TestCase):
+    def test_values_and_in_lists_are_dropped(self):
+        self.assertEqual(
+            querywatch.fingerprint(
+                "SELECT * FROM t WHERE a = 'x''y' AND b = 42\n"
+                "AND c IN (%s, %s, %s)"
+            ),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)'
+        )
+        self.assertEqual(
+            querywatch.fingerprint('SELECT * FROM t WHERE c IN (%s)'),
+            querywatch.fingerprint('SELECT * FROM t WHERE c IN (%s, %s)'),
+        )
+
+
+class QueryWatchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for i in range(querywatch.settings.QUERYWATCH_REPEAT_THRESHOLD):
+            author = User.objects.create_user(username=f'user_{i}')
+            Post.objects.create(author=author, text=f'Post #{i}')
+
+    def read_authors(self):
+        return [post.author.username for post in Post.objects.all()]
+
+    def test_n_plus_one_raises(self):
+        with self.assertRaisesRegex(querywatch.QueryWatchError,
+                                    'core/tests/test_querywatch.py:'):
+            with querywatch.watch(querywatch.RAISE):
+                self.read_authors()
+
+    def test_select_related_passes(self):
+        with querywatch.watch(querywatch.RAISE) as watcher:
+            [post.author.username
+             for post in Post.objects.select_related('author')]
+        self.assertEqual(watcher.repeated, [])
+
+    def test_log_mode(self):
+        with self.assertLogs('core.querywatch', 'WARNING') as logs:
+            with querywatch.watch(querywatch.LOG) as watcher:
+                self.read_authors()
+        self.assertEqual(len(watcher.repeated), 1)
+        self.assertIn('Вероятный N+1', logs.output[0])
+
+    def test_slow_queries_are_logged(self):
+        with self.assertLogs('core.querywatch', 'WARNING') as logs:
+            with querywatch.watch(querywatch.LOG, slow_query_ms=0):
+                Post.objects.count()
+        self.assertIn('Медленный запрос', logs.output[0])
+
+    def test_off_mode(self):
+        with querywatch.watch(querywatch.OFF) as watcher:
+            self.read_authors()
+        self.assertEqual(watcher.counts, {})
+
+    @override_settings(QUERYWATCH_MODE=querywatch.RAISE,
+                       QUERYWATCH_REPEAT_THRESHOLD=1)
+    def test_middleware(self):
+        """Middleware следит за запросами к страницам."""
+        with self.assertRaises(querywatch.QueryWatchError):
+            Client().get(reverse('posts:index'))
@@ -0,0 +1,15 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse
+
+from . import metrics
+
+
+PROMETHEUS_CONTENT_TYPE: str = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@staff_member_required
+def metrics_view(request):
+    """Метрики процесса в текстовом формате Prometheus."""
+    return HttpResponse(
+        metrics.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE
+    )
@@ -1,6 +1,29 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
 
-from .models import Post, Group, Comment
+from . import exporter, search
+from .models import Post, Group, Comment, Follow
+
+
+def export_action(name, export_format):
+    """Действие админки: потоковая выгрузка выбранных строк."""
+    def action(modeladmin, request, queryset):
+        response = StreamingHttpResponse(
+            exporter.stream(name, export_format, queryset=queryset),
+            content_type=exporter.CONTENT_TYPES[export_format],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{name}.{export_format}"'
+        )
+        return response
+    action.__name__ = f'export_{export_format}'
+    action.short_description = f'Выгрузить в {export_format.upper()}'
+    return action
+
+
+def export_actions(name):
+    return [export_action(name, export_format)
+            for export_format in exporter.FORMATS]
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -10,6 +33,16 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    actions = export_actions('posts')
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Поиск по полнотекстовому индексу вместо LIKE по тексту. Список
+        админки показывает все совпадения, а не SEARCH_CANDIDATES.
+        """
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -17,13 +50,21 @@ class GroupAdmin(admin.ModelAdmin):
     list_display = ('pk', 'title', 'slug', 'description')
     search_field = ('title',)
     empty_value_display = '-пусто-'
+    actions = export_actions('groups')
 
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('pk', 'post', 'author', 'text')
     search_fields = ('author__username',)
+    actions = export_actions('comments')
+
+
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'author')
+    search_fields = ('user__username', 'author__username')
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,37 @@
+"""
+Фоновые задачи процесса.
+
+Миниатюры, дополнение лент и отложенная переиндексация поиска идут в
+пулах потоков, по пулу на вид задач. Пул создается при первой задаче,
+то есть уже в процессе воркера, а не в мастер-процессе до fork.
+
+drain() дожидается всех поставленных задач и закрывает пулы. Он нужен
+перед тем, как база, с которой работают задачи, перестанет быть
+доступной, например при выходе из временной базы бенчмарка.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+
+_executors = {}
+_executors_lock = Lock()
+
+
+def get_executor(name, workers):
+    """Пул задач name на workers потоков."""
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = _executors[name] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix=name,
+            )
+    return executor
+
+
+def drain():
+    """Дожидается поставленных задач и закрывает все пулы."""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=True)
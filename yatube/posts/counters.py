@@ -0,0 +1,168 @@
+"""
+Денормализованные счетчики постов, комментариев и подписчиков.
+
+Счетчики обновляются сигналами при сохранении и удалении постов,
+комментариев и подписок. Отсутствующий счетчик считается неизвестным: он
+вычисляется через COUNT(*) при первом чтении или первом изменении и
+дальше поддерживается инкрементами. Расхождения исправляет команда
+recount_counters.
+"""
+from django.db import transaction
+from django.db.models import (
+    CharField, Count, F, OuterRef, Subquery, Value,
+)
+from django.db.models.functions import Cast, Concat
+
+from .models import Comment, Counter, Follow, Post
+
+
+POSTS: str = 'posts'
+
+
+def author_posts_key(author_id):
+    return f'posts:author:{author_id}'
+
+
+def group_posts_key(group_id):
+    return f'posts:group:{group_id}'
+
+
+def post_comments_key(post_id):
+    return f'comments:post:{post_id}'
+
+
+def author_followers_key(author_id):
+    return f'followers:author:{author_id}'
+
+
+def count_subquery(make_key, field):
+    """
+    Значение счетчика make_key(<значение field>) для подстановки
+    в annotate(); отсутствующий счетчик дает None.
+    """
+    return Subquery(
+        Counter.objects.filter(key=Concat(
+            Value(make_key('')),
+            Cast(OuterRef(field), CharField()),
+            output_field=CharField(),
+        )).values('value')[:1]
+    )
+
+
+def _queryset_for(key):
+    """Queryset, число строк которого хранит счетчик key."""
+    if key == POSTS:
+        return Post.objects.all()
+    scope, kind, object_id = key.split(':')
+    if scope == 'posts' and kind == 'author':
+        return Post.objects.filter(author_id=object_id)
+    if scope == 'posts' and kind == 'group':
+        return Post.objects.filter(group_id=object_id)
+    if scope == 'comments' and kind == 'post':
+        return Comment.objects.filter(post_id=object_id)
+    if scope == 'followers' and kind == 'author':
+        return Follow.objects.filter(author_id=object_id)
+    raise ValueError(f'Неизвестный счетчик: {key}')
+
+
+def _create(key):
+    """
+    Создает отсутствующий счетчик key по таблице. Возвращает счетчик и
+    признак того, что его создал этот вызов, а не параллельный запрос.
+    """
+    with transaction.atomic():
+        return Counter.objects.get_or_create(
+            key=key, defaults={'value': _queryset_for(key).count()}
+        )
+
+
+def get_count(key):
+    """Значение счетчика; отсутствующий счетчик вычисляется и сохраняется."""
+    value = (
+        Counter.objects.filter(key=key)
+        .values_list('value', flat=True).first()
+    )
+    if value is not None:
+        return value
+    counter, _ = _create(key)
+    return counter.value
+
+
+def _shift(counters, delta):
+    if delta < 0:
+        counters = counters.filter(value__gte=-delta)
+    return counters.update(value=F('value') + delta)
+
+
+def change(keys, delta):
+    """
+    Сдвигает счетчики keys на delta. Отсутствующий счетчик создается
+    по таблице, где изменение уже учтено: иначе изменение, сделанное,
+    пока get_count считал строки, потерялось бы.
+    """
+    keys = [key for key in keys if key is not None]
+    counters = Counter.objects.filter(key__in=keys)
+    if _shift(counters, delta) == len(keys):
+        return
+    existing = set(counters.values_list('key', flat=True))
+    for key in keys:
+        if key in existing:
+            continue
+        _, created = _create(key)
+        if not created:
+            _shift(Counter.objects.filter(key=key), delta)
+
+
+def forget(keys):
+    Counter.objects.filter(key__in=keys).delete()
+
+
+def post_keys(author_id, group_id):
+    keys = [POSTS, author_posts_key(author_id)]
+    if group_id is not None:
+        keys.append(group_posts_key(group_id))
+    return keys
+
+
+def actual_counts():
+    """Точные значения всех счетчиков, посчитанные по таблицам."""
+    counts = {POSTS: Post.objects.count()}
+    grouped = (
+        (Post.objects.order_by().values_list('author_id'),
+         author_posts_key),
+        (Post.objects.order_by().exclude(group=None)
+         .values_list('group_id'), group_posts_key),
+        (Comment.objects.order_by().exclude(post=None)
+         .values_list('post_id'), post_comments_key),
+        (Follow.objects.order_by().values_list('author_id'),
+         author_followers_key),
+    )
+    for queryset, make_key in grouped:
+        for object_id, value in queryset.annotate(value=Count('id')):
+            counts[make_key(object_id)] = value
+    return counts
+
+
+def reconcile(dry_run=False):
+    """
+    Сверяет сохраненные счетчики с таблицами и исправляет расхождения.
+
+    Возвращает словарь {ключ: (сохраненное, актуальное)} для счетчиков,
+    которые разошлись с данными.
+    """
+    with transaction.atomic():
+        actual = actual_counts()
+        stored = dict(Counter.objects.values_list('key', 'value'))
+        drift = {
+            key: (value, actual.get(key, 0))
+            for key, value in stored.items()
+            if value != actual.get(key, 0)
+        }
+        if not dry_run:
+            Counter.objects.all().delete()
+            Counter.objects.bulk_create(
+                (Counter(key=key, value=value)
+                 for key, value in actual.items()),
+                batch_size=1000,
+            )
+    return drift
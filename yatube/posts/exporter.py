@@ -0,0 +1,180 @@
+"""
+Потоковая выгрузка постов, комментариев и групп в NDJSON и CSV.
+
+Строки читаются через values_list() и iterator(chunk_size=...) — на
+PostgreSQL это курсор на стороне сервера — и сразу отдаются дальше
+кусками по STREAM_CHUNK_SIZE байт, при необходимости сжатыми gzip.
+Память не зависит от размера выгрузки, в отличие от dumpdata. Посты
+выгружаются в формате, который принимает загрузка (posts/importer.py).
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Comment, Group, Post
+
+
+CHUNK_SIZE: int = 2000
+STREAM_CHUNK_SIZE: int = 64 * 1024
+
+NDJSON: str = 'ndjson'
+CSV: str = 'csv'
+FORMATS = (NDJSON, CSV)
+CONTENT_TYPES = {
+    NDJSON: 'application/x-ndjson; charset=utf-8',
+    CSV: 'text/csv; charset=utf-8',
+}
+
+
+class Export:
+    """
+    Что выгружать: модель, столбцы (имя, поле для values_list), поле
+    даты и поля для фильтров по группе и автору. None — фильтр не
+    применим.
+    """
+
+    def __init__(self, model, columns, date_field=None, group_field=None,
+                 author_field=None):
+        self.model = model
+        self.columns = columns
+        self.date_field = date_field
+        self.group_field = group_field
+        self.author_field = author_field
+
+    @property
+    def names(self):
+        return [name for name, _ in self.columns]
+
+
+EXPORTS = {
+    'posts': Export(
+        Post,
+        (('id', 'id'), ('author', 'author__username'),
+         ('group', 'group__slug'), ('text', 'text'),
+         ('pub_date', 'pub_date'), ('image', 'image')),
+        date_field='pub_date',
+        group_field='group__slug',
+        author_field='author__username',
+    ),
+    'comments': Export(
+        Comment,
+        (('id', 'id'), ('post', 'post_id'),
+         ('author', 'author__username'), ('text', 'text'),
+         ('created', 'created')),
+        date_field='created',
+        group_field='post__group__slug',
+        author_field='author__username',
+    ),
+    'groups': Export(
+        Group,
+        (('id', 'id'), ('slug', 'slug'), ('title', 'title'),
+         ('description', 'description')),
+        group_field='slug',
+    ),
+}
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_queryset(export, queryset, since=None, until=None, group=None,
+                    author=None):
+    """
+    Отбирает строки с датой в днях от since до until включительно, из
+    группы со slug group и от автора с именем author.
+    """
+    if (since or until) and export.date_field is None:
+        raise ValueError('Фильтр по дате к этой выгрузке не применим.')
+    if since:
+        queryset = queryset.filter(
+            **{f'{export.date_field}__gte': _start_of_day(since)}
+        )
+    if until:
+        queryset = queryset.filter(**{
+            f'{export.date_field}__lt':
+                _start_of_day(until + timedelta(days=1))
+        })
+    if group:
+        queryset = queryset.filter(**{export.group_field: group})
+    if author:
+        if export.author_field is None:
+            raise ValueError('Фильтр по автору к этой выгрузке не применим.')
+        queryset = queryset.filter(**{export.author_field: author})
+    return queryset
+
+
+def iter_rows(export, queryset, chunk_size=CHUNK_SIZE):
+    """Строки выгрузки словарями, без создания объектов моделей."""
+    fields = [field for _, field in export.columns]
+    rows = queryset.order_by('id').values_list(*fields)
+    for values in rows.iterator(chunk_size=chunk_size):
+        yield {
+            name: value.isoformat() if isinstance(value, datetime)
+            else value
+            for name, value in zip(export.names, values)
+        }
+
+
+class _Echo:
+    """Файл для csv.writer, который возвращает записанное."""
+
+    def write(self, value):
+        return value
+
+
+def iter_lines(export, rows, export_format):
+    if export_format == NDJSON:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+        return
+    writer = csv.writer(_Echo())
+    yield writer.writerow(export.names)
+    for row in rows:
+        yield writer.writerow(row.values())
+
+
+def iter_chunks(lines, chunk_size=STREAM_CHUNK_SIZE):
+    """Склеивает строки в куски байтов не меньше chunk_size."""
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(name, export_format=NDJSON, queryset=None, compress=False,
+           **filters):
+    """
+    Выгрузка name из EXPORTS кусками байтов. queryset сужает выгрузку
+    (например, до выбранного в админке), filters — см. filter_queryset.
+    """
+    if export_format not in FORMATS:
+        raise ValueError(f'Неизвестный формат {export_format}.')
+    export = EXPORTS[name]
+    if queryset is None:
+        queryset = export.model.objects.all()
+    queryset = filter_queryset(export, queryset, **filters)
+    chunks = iter_chunks(
+        iter_lines(export, iter_rows(export, queryset), export_format)
+    )
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,261 @@
+"""
+Кэш страниц лент с поколениями вместо времени жизни.
+
+У каждой области (вся лента, группа, автор, пост) есть поколение —
+время последнего изменения в миллисекундах. Сигналы моделей сдвигают
+поколения затронутых областей, а страницы хранятся бессрочно под
+ключом, в который входят текущие поколения. Изменение сразу делает
+старые страницы недостижимыми, а без изменений кэш не сбрасывается.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from core import metrics
+
+from .models import Post
+
+
+FEED_CACHE_TIMEOUT = None
+GENERATION_KEY: str = 'feed:generation:{}'
+PAGE_KEY: str = 'feed:page:{}'
+FRAGMENT_KEY: str = 'feed:fragment:{}'
+POST_AUTHOR_KEY: str = 'feed:post-author:{}'
+
+POSTS: str = 'posts'
+GROUPS: str = 'groups'
+AUTHORS: str = 'authors'
+# Области, от которых зависит любая страница: названия групп и имена
+# авторов выводятся в карточках постов всех лент.
+COMMON_SCOPES = (GROUPS, AUTHORS)
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def user_scope(user_id):
+    """Область того, что страница показывает конкретному пользователю."""
+    return f'user:{user_id}'
+
+
+def post_scopes(post):
+    """Области, страницы которых выводят пост."""
+    scopes = [POSTS, author_scope(post.author.username), post_scope(post.pk)]
+    if post.group_id is not None:
+        scopes.append(group_scope(post.group.slug))
+    return scopes
+
+
+def post_author_scope(post_id):
+    """
+    Область автора поста. Автор поста меняется разве что в админке, и
+    тогда запись сбрасывает forget_post_author, поэтому имя хранится в
+    кэше бессрочно и база читается один раз на пост.
+    """
+    key = POST_AUTHOR_KEY.format(post_id)
+    username = cache.get(key)
+    if username is None:
+        username = (
+            Post.objects.filter(pk=post_id)
+            .values_list('author__username', flat=True).first()
+        )
+        if username is None:
+            return None
+        cache.set(key, username, FEED_CACHE_TIMEOUT)
+    return author_scope(username)
+
+
+def forget_post_author(post_id):
+    cache.delete(POST_AUTHOR_KEY.format(post_id))
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def get_generations(scopes):
+    """Текущие поколения областей; новые области получают текущее время."""
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        now = _now_ms()
+        for key in missing:
+            cache.add(key, now, FEED_CACHE_TIMEOUT)
+        generations.update(cache.get_many(missing))
+    return [generations.get(key, 0) for key in keys]
+
+
+def _bump(scopes):
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    current = cache.get_many(keys)
+    now = _now_ms()
+    cache.set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys},
+        FEED_CACHE_TIMEOUT,
+    )
+
+
+def bump_generations(*scopes):
+    """
+    Сдвигает поколения областей сразу и еще раз после фиксации
+    транзакции, чтобы страница, собранная по данным до фиксации,
+    не осталась в кэше под новым поколением.
+    """
+    scopes = [scope for scope in scopes if scope is not None]
+    if not scopes:
+        return
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def _make_key(template, name, scopes, request):
+    generations = get_generations([*COMMON_SCOPES, *scopes])
+    raw = ':'.join([
+        name,
+        *map(str, generations),
+        request.method,
+        request.get_full_path(),
+    ])
+    return template.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def page_key(view_name, scopes, request):
+    return _make_key(PAGE_KEY, view_name, scopes, request)
+
+
+def fragment_key(fragment_name, scopes, request):
+    return _make_key(FRAGMENT_KEY, fragment_name, scopes, request)
+
+
+def _is_cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    )
+
+
+def _resolve_scopes(scope_templates, kwargs):
+    scopes = []
+    for template in scope_templates:
+        if callable(template):
+            scopes.append(template(**kwargs))
+        else:
+            scopes.append(template.format(**kwargs))
+    return [scope for scope in scopes if scope is not None]
+
+
+def cache_feed(*scope_templates):
+    """
+    Кэширует страницу для анонимных пользователей под поколениями
+    областей scope_templates. Область задается шаблоном строки,
+    например 'group:{slug}', или функцией; и то и другое получает
+    именованные аргументы view.
+
+    Страницы авторизованных пользователей собираются заново, а их общие
+    части кэширует тег {% feedcache %}.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            scopes = _resolve_scopes(scope_templates, kwargs)
+            key = page_key(view.__name__, scopes, request)
+            response = cache.get(key)
+            metrics.count_cache('page', response is not None)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if _is_cacheable(response):
+                    cache.set(key, response, FEED_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
+
+
+def feed_validators(request, scopes):
+    """
+    ETag и время изменения страницы по поколениям ее областей.
+    Поколение — время последнего изменения, поэтому заголовки
+    вычисляются без обращения к базе. Авторизованный пользователь
+    видит свой вариант страницы, поэтому в ETag входит его id и
+    поколение его области. В его страницах есть формы с токеном CSRF,
+    поэтому в ETag входит и cookie CSRF: после смены токена страница с
+    устаревшим токеном не должна отдаваться ответом 304.
+    """
+    variant = 'anonymous'
+    csrf_cookie = ''
+    if request.user.is_authenticated:
+        variant = user_scope(request.user.pk)
+        scopes = [*scopes, variant]
+        # get_token заводит cookie, если ее еще нет, и ETag первого
+        # ответа совпадает с ETag следующих запросов с этой cookie.
+        get_token(request)
+        csrf_cookie = request.META['CSRF_COOKIE']
+    generations = get_generations([*COMMON_SCOPES, *scopes])
+    raw = ':'.join([
+        variant, csrf_cookie, *map(str, generations),
+        request.get_full_path(),
+    ])
+    etag = hashlib.md5(raw.encode()).hexdigest()
+    last_modified = datetime.fromtimestamp(
+        max(generations) // 1000, tz=timezone.utc
+    )
+    return etag, last_modified
+
+
+def feed_condition(*scope_templates):
+    """
+    Условный GET для страниц, которые зависят только от областей
+    scope_templates (шаблоны те же, что у cache_feed): ETag и
+    Last-Modified берутся из поколений, а неизмененная страница
+    отдается ответом 304 без вызова view. Страница зависит от
+    пользователя, поэтому ответ помечается Vary: Cookie.
+    """
+    def get_validators(request, kwargs):
+        validators = getattr(request, '_feed_validators', None)
+        if validators is None:
+            validators = feed_validators(
+                request, _resolve_scopes(scope_templates, kwargs)
+            )
+            request._feed_validators = validators
+        return validators
+
+    def etag(request, *args, **kwargs):
+        return get_validators(request, kwargs)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return get_validators(request, kwargs)[1]
+
+    def decorator(view):
+        return vary_on_cookie(condition(
+            etag_func=etag, last_modified_func=last_modified
+        )(view))
+    return decorator
+
+
+def feed_page(*scope_templates):
+    """Кэш страницы и условный GET по одним и тем же областям."""
+    def decorator(view):
+        return feed_condition(*scope_templates)(
+            cache_feed(*scope_templates)(view)
+        )
+    return decorator
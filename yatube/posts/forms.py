@@ -1,15 +1,38 @@
 from django import forms
+from django.core.exceptions import ValidationError
 from .models import Post, Comment
+from .uploadhandlers import max_pixels, too_many_pixels_message
+
+
+class BoundedImageField(forms.ImageField):
+    """
+    Картинка с ограничением числа пикселей. Ошибку потокового приема
+    (posts/uploadhandlers.py) выводит вместо проверки самого файла.
+    """
+    def to_python(self, data):
+        upload_error = getattr(data, 'upload_error', None)
+        if upload_error:
+            raise ValidationError(upload_error, code='upload_error')
+        image_file = super().to_python(data)
+        if image_file is not None:
+            width, height = image_file.image.size
+            image_format = image_file.image.format
+            if width * height > max_pixels(image_format):
+                raise ValidationError(
+                    too_many_pixels_message(width, height, image_format),
+                    code='too_many_pixels',
+                )
+        return image_file
 
 
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
+        field_classes = {'image': BoundedImageField}
 
 
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
-
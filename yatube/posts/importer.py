@@ -0,0 +1,257 @@
+"""
+Массовая загрузка постов из NDJSON.
+
+Каждая строка — объект JSON:
+
+    {"author": "leo", "text": "...", "group": "cats",
+     "pub_date": "2021-05-01T12:00:00+03:00", "image": "posts/cat.jpg"}
+
+group, pub_date и image необязательны; image — путь к уже загруженному
+файлу в хранилище медиа. Посты пишутся через bulk_create пачками по
+batch_size в обход сигналов, а счетчики, поколения кэша лент, ленты
+подписчиков, поисковый индекс и миниатюры обновляются одним проходом
+после загрузки по диапазонам id новых постов. Id запоминаются по
+каждой пачке, поэтому посты, которые пользователи публикуют во время
+загрузки, в проход не попадают.
+
+Пачки фиксируются по отдельности: если загрузка прервется, уже
+записанные посты останутся без прохода. Тогда счетчики исправит команда
+recount_counters, а ленты и индекс пересоберут timeline.rebuild() и
+search.rebuild().
+"""
+import json
+from collections import defaultdict
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed_cache, search, thumbnails, timeline
+from .models import Group, Post, User
+
+
+BATCH_SIZE: int = 1000
+# Сколько ошибок возвращать в отчете; считаются все.
+MAX_REPORTED_ERRORS: int = 100
+
+TEXT_MAX_LENGTH = Post._meta.get_field('text').max_length
+
+
+class ImportResult:
+    """Итог загрузки: число созданных постов и ошибки по строкам."""
+
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'error': message})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+def parse_line(line):
+    """Проверяет строку и возвращает поля поста или ValueError."""
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError('Ожидается объект JSON.')
+    text = data.get('text')
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError('Нет текста поста.')
+    if len(text) > TEXT_MAX_LENGTH:
+        raise ValueError(
+            f'Текст длиннее {TEXT_MAX_LENGTH} символов.'
+        )
+    author = data.get('author')
+    if not isinstance(author, str) or not author:
+        raise ValueError('Нет автора поста.')
+    group = data.get('group') or None
+    if group is not None and not isinstance(group, str):
+        raise ValueError('Группа задается адресом (slug).')
+    pub_date = data.get('pub_date') or None
+    if pub_date is not None:
+        pub_date = parse_datetime(str(pub_date))
+        if pub_date is None:
+            raise ValueError('Неверный формат даты публикации.')
+        if timezone.is_naive(pub_date):
+            pub_date = timezone.make_aware(pub_date)
+    image = data.get('image') or ''
+    if image:
+        try:
+            exists = default_storage.exists(image)
+        except SuspiciousFileOperation:
+            exists = False
+        if not exists:
+            raise ValueError(f'Картинка {image} не найдена.')
+    return {
+        'author': author,
+        'text': text,
+        'group': group,
+        'pub_date': pub_date,
+        'image': image,
+    }
+
+
+class Importer:
+    """
+    Загружает посты пачками и помнит, что обновить после загрузки.
+    create_authors — создавать ли неизвестных авторов без пароля.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, create_authors=False):
+        self.batch_size = batch_size
+        self.create_authors = create_authors
+        self.result = ImportResult()
+        self.author_ids = {}
+        self.group_ids = {}
+        self.counter_deltas = defaultdict(int)
+        self.scopes = set()
+        # Диапазоны id записанных постов [первый, последний].
+        self.id_ranges = []
+
+    def run(self, lines, progress=None):
+        """
+        Загружает посты из строк lines (str или bytes).
+        progress(created, failed) вызывается после каждой пачки.
+        """
+        batch = []
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                batch.append((line_number, parse_line(line)))
+            except ValueError as error:
+                self.result.add_error(line_number, str(error))
+            if len(batch) == self.batch_size:
+                self.write_batch(batch)
+                batch = []
+                if progress is not None:
+                    progress(self.result.created, self.result.failed)
+        if batch:
+            self.write_batch(batch)
+            if progress is not None:
+                progress(self.result.created, self.result.failed)
+        if self.result.created:
+            self.finish()
+        self.result.errors.sort(key=lambda error: error['line'])
+        return self.result
+
+    def resolve_authors(self, usernames):
+        missing = set(usernames) - set(self.author_ids)
+        if not missing:
+            return
+        self.author_ids.update(
+            User.objects.filter(username__in=missing)
+            .values_list('username', 'id')
+        )
+        missing -= set(self.author_ids)
+        if missing and self.create_authors:
+            users = []
+            for username in sorted(missing):
+                user = User(username=username)
+                user.set_unusable_password()
+                users.append(user)
+            User.objects.bulk_create(users, ignore_conflicts=True)
+            self.author_ids.update(
+                User.objects.filter(username__in=missing)
+                .values_list('username', 'id')
+            )
+
+    def resolve_groups(self, slugs):
+        missing = set(slugs) - set(self.group_ids) - {None}
+        if missing:
+            self.group_ids.update(
+                Group.objects.filter(slug__in=missing)
+                .values_list('slug', 'id')
+            )
+
+    def write_batch(self, batch):
+        self.resolve_authors(row['author'] for _, row in batch)
+        self.resolve_groups(row['group'] for _, row in batch)
+        posts = []
+        for line_number, row in batch:
+            author_id = self.author_ids.get(row['author'])
+            if author_id is None:
+                self.result.add_error(
+                    line_number, f'Автор {row["author"]} не найден.'
+                )
+                continue
+            group_id = None
+            if row['group'] is not None:
+                group_id = self.group_ids.get(row['group'])
+                if group_id is None:
+                    self.result.add_error(
+                        line_number, f'Группа {row["group"]} не найдена.'
+                    )
+                    continue
+                self.scopes.add(feed_cache.group_scope(row['group']))
+            self.scopes.add(feed_cache.author_scope(row['author']))
+            for key in counters.post_keys(author_id, group_id):
+                self.counter_deltas[key] += 1
+            posts.append(Post(
+                author_id=author_id,
+                group_id=group_id,
+                text=row['text'],
+                pub_date=row['pub_date'] or timezone.now(),
+                image=row['image'],
+            ))
+        if not posts:
+            return
+        with transaction.atomic():
+            Post.objects.bulk_create(posts)
+            if posts[0].pk is not None:
+                post_ids = [post.pk for post in posts]
+            else:
+                # SQLite не возвращает id из bulk_create. Писатель у него
+                # один, и до конца транзакции никто другой посты не
+                # добавит, так что последние len(posts) id — наши.
+                post_ids = list(
+                    Post.objects.order_by('-id')
+                    .values_list('id', flat=True)[:len(posts)]
+                )
+        self.add_ids(post_ids)
+        self.result.created += len(posts)
+
+    def add_ids(self, post_ids):
+        for post_id in sorted(post_ids):
+            if self.id_ranges and self.id_ranges[-1][1] == post_id - 1:
+                self.id_ranges[-1][1] = post_id
+            else:
+                self.id_ranges.append([post_id, post_id])
+
+    def finish(self):
+        """Один проход по новым постам вместо сигналов на каждый пост."""
+        keys_by_delta = defaultdict(list)
+        for key, delta in self.counter_deltas.items():
+            keys_by_delta[delta].append(key)
+        for delta, keys in keys_by_delta.items():
+            counters.change(keys, delta)
+        feed_cache.bump_generations(feed_cache.POSTS, *self.scopes)
+        backend = search.get_backend()
+        for first_id, last_id in self.id_ranges:
+            timeline.fan_out_range(first_id - 1, last_id)
+            backend.index(
+                'p.id >= %s AND p.id <= %s', [first_id, last_id]
+            )
+            with_images = (
+                Post.objects.filter(id__gte=first_id, id__lte=last_id)
+                .exclude(image='').only('id')
+            )
+            for post in with_images.iterator():
+                thumbnails.schedule_thumbnail(post)
+
+
+def import_posts(lines, batch_size=BATCH_SIZE, create_authors=False,
+                 progress=None):
+    """Загружает посты из строк NDJSON и возвращает ImportResult."""
+    return Importer(batch_size, create_authors).run(lines, progress)
@@ -0,0 +1,104 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import Post, TimelineEntry, User
+from posts.seeding import seed, temporary_database
+from posts.views import SHOWN_POSTS_NUMBER
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет временную базу пользователями, постами и подписками '
+        'и сравнивает чтение личной ленты через join с подписками '
+        'и из разложенных лент TimelineEntry.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument(
+            '--follows', type=int, default=50,
+            help='Число подписок у каждого пользователя.',
+        )
+        parser.add_argument(
+            '--readers', type=int, default=200,
+            help='Сколько случайных лент читать при замере.',
+        )
+        parser.add_argument(
+            '--pages', type=int, default=5,
+            help='Сколько страниц каждой ленты листать.',
+        )
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            self.stdout.write('Наполняем базу...')
+            seeded = seed(
+                posts=options['posts'],
+                authors=options['users'],
+                groups=0,
+                follows=options['follows'],
+                progress=self.progress,
+            )
+            self.stdout.write('Раскладываем посты по лентам...')
+            started = time.perf_counter()
+            timeline.rebuild()
+            self.stdout.write(
+                f'  {TimelineEntry.objects.count()} записей за '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+            readers = list(User.objects.filter(pk__in=random.Random(0).sample(
+                seeded['user_ids'],
+                min(options['readers'], len(seeded['user_ids'])),
+            )))
+            reader = readers[0]
+            self.explain('join с подписками', self.join_feed(reader))
+            self.explain(
+                'разложенная лента',
+                timeline.get_paginator(reader, SHOWN_POSTS_NUMBER)
+                .object_list[:SHOWN_POSTS_NUMBER],
+            )
+            for title, read in (('join с подписками', self.read_join),
+                                ('разложенная лента', self.read_timeline)):
+                started = time.perf_counter()
+                for reader in readers:
+                    read(reader, options['pages'])
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{title}: {elapsed * 1000 / len(readers):.2f} мс '
+                    f'на {options["pages"]} стр. ленты'
+                )
+
+    def progress(self, name, done, total):
+        self.stdout.write(f'  {name}: {done}/{total}', ending='\r')
+        if done == total:
+            self.stdout.write('')
+
+    def explain(self, title, queryset):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for line in queryset.explain().splitlines():
+            self.stdout.write(f'    {line}')
+
+    def join_feed(self, reader):
+        return (
+            Post.objects.for_feed()
+            .filter(author__following__user=reader)[:SHOWN_POSTS_NUMBER]
+        )
+
+    def read_join(self, reader, pages):
+        """Наивная лента: join постов с подписками и OFFSET."""
+        feed = Post.objects.for_feed().filter(author__following__user=reader)
+        for page in range(pages):
+            offset = page * SHOWN_POSTS_NUMBER
+            list(feed[offset:offset + SHOWN_POSTS_NUMBER])
+
+    def read_timeline(self, reader, pages):
+        paginator = timeline.get_paginator(reader, SHOWN_POSTS_NUMBER)
+        page = paginator.get_page()
+        for _ in range(pages):
+            [entry.post for entry in page]
+            if not page.has_next():
+                break
+            page = paginator.get_page(page.next_cursor)
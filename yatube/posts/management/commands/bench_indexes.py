@@ -0,0 +1,104 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.models import Comment, Post
+from posts.paginators import CursorPaginator
+from posts.seeding import seed, temporary_database
+from posts.views import SHOWN_POSTS_NUMBER
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет временную базу постами и сравнивает планы и время '
+        'запросов лент без составных индексов и с ними.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--authors', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--comments', type=int, default=100_000)
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз выполнять каждый запрос при замере.',
+        )
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            self.stdout.write('Наполняем базу...')
+            seeded = seed(
+                posts=options['posts'],
+                authors=options['authors'],
+                groups=options['groups'],
+                comments=options['comments'],
+                progress=self.progress,
+            )
+            queries = self.feed_queries(seeded)
+            self.drop_indexes()
+            before = self.measure(queries, options['repeat'])
+            self.create_indexes()
+            after = self.measure(queries, options['repeat'])
+        for name in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for title, results in (('без индексов', before),
+                                   ('с индексами', after)):
+                plan, elapsed = results[name]
+                self.stdout.write(f'  {title}: {elapsed * 1000:.2f} мс')
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+
+    def progress(self, name, done, total):
+        self.stdout.write(f'  {name}: {done}/{total}', ending='\r')
+        if done == total:
+            self.stdout.write('')
+
+    def feed_queries(self, seeded):
+        """Запросы, которые выполняют ленты из posts/views.py."""
+        middle = Post.objects.order_by('-pub_date', '-id')[
+            len(seeded['post_ids']) // 2]
+        group_id = seeded['group_ids'][0]
+        author_id = seeded['user_ids'][0]
+        post_id = (
+            Comment.objects.order_by().values_list('post_id', flat=True)
+            .first() or middle.pk
+        )
+        feed = Post.objects.for_feed()
+        cursor = CursorPaginator(feed, SHOWN_POSTS_NUMBER)
+        return {
+            'index: первая страница': feed[:SHOWN_POSTS_NUMBER],
+            'index: курсор на середину ленты': cursor.object_list.filter(
+                cursor.keyset_filter([middle.pub_date, middle.pk])
+            )[:SHOWN_POSTS_NUMBER],
+            'group_posts: первая страница': feed.filter(
+                group_id=group_id)[:SHOWN_POSTS_NUMBER],
+            'profile: первая страница': feed.filter(
+                author_id=author_id)[:SHOWN_POSTS_NUMBER],
+            'post_detail: комментарии': Comment.objects.filter(
+                post_id=post_id),
+        }
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, queryset in queries.items():
+            plan = queryset.explain()
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            results[name] = (plan, (time.perf_counter() - started) / repeat)
+        return results
+
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in (Post, Comment):
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+
+    def create_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in (Post, Comment):
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
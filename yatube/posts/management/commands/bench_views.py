@@ -0,0 +1,312 @@
+import json
+import math
+import os
+import random
+import resource
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Group, Post, User
+from posts.seeding import seed, temporary_database
+
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, percent):
+    """Процентиль методом ближайшего ранга."""
+    if not sorted_values:
+        return None
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def rss_mb():
+    """Текущий RSS процесса; без /proc — пиковый."""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class QueryCounter:
+    """Обертка execute_wrapper, которая считает запросы к базе."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет временную базу и нагружает публичные страницы '
+        'несколькими потоками через тестовый клиент: p50/p95/p99, '
+        'запросы к базе на страницу, RSS и пропускная способность. '
+        'Результаты сохраняются в JSON для сравнения между коммитами.'
+    )
+
+    # Страницы: имя -> (метод, нужен ли вход).
+    VIEWS = {
+        'index': ('get', False),
+        'group_posts': ('get', False),
+        'profile': ('get', False),
+        'post_detail': ('get', False),
+        'post_create': ('post', True),
+        'add_comment': ('post', True),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--authors', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--comments', type=int, default=100_000)
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Сколько запросов к каждой странице.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Сколько потоков шлют запросы одновременно.',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=20,
+            help='Запросы к каждой странице перед замером.',
+        )
+        parser.add_argument(
+            '--views', nargs='+', choices=sorted(self.VIEWS),
+            default=list(self.VIEWS),
+        )
+        parser.add_argument(
+            '--cold-cache', action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--random-seed', type=int, default=0,
+        )
+        parser.add_argument(
+            '--output', help='Куда сохранить результаты в JSON.',
+        )
+        parser.add_argument(
+            '--compare', help='JSON прошлого замера для сравнения.',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('Нужны хотя бы один поток и один запрос.')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as file:
+                    baseline = json.load(file)['views']
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError(error)
+        # Отладочный курсор и запись запросов искажают замер.
+        with override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            with temporary_database(name=self.database_name()):
+                self.stdout.write('Наполняем базу...')
+                seeded = seed(
+                    posts=options['posts'],
+                    authors=options['authors'],
+                    groups=options['groups'],
+                    comments=options['comments'],
+                    random_seed=options['random_seed'],
+                    progress=self.progress,
+                )
+                self.targets = self.load_targets(seeded)
+                results = {}
+                for name in options['views']:
+                    results[name] = self.bench_view(name, options)
+                    self.report(name, results[name], baseline)
+        report = {
+            'revision': git_revision(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'options': {
+                key: options[key] for key in (
+                    'posts', 'authors', 'groups', 'comments', 'requests',
+                    'concurrency', 'warmup', 'cold_cache', 'random_seed',
+                )
+            },
+            'views': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+    def database_name(self):
+        """Файл для тестовой базы SQLite, чтобы потоки могли писать."""
+        if connection.vendor != 'sqlite':
+            return None
+        return os.path.join(tempfile.gettempdir(), 'yatube_bench.sqlite3')
+
+    def progress(self, name, done, total):
+        self.stdout.write(f'  {name}: {done}/{total}', ending='\r')
+        if done == total:
+            self.stdout.write('')
+
+    def load_targets(self, seeded):
+        """Адреса, имена и id, из которых выбираются цели запросов."""
+        return {
+            'usernames': list(
+                User.objects.filter(pk__in=seeded['user_ids'])
+                .values_list('username', flat=True)
+            ),
+            'user_ids': seeded['user_ids'],
+            'group_ids': seeded['group_ids'],
+            'slugs': list(
+                Group.objects.filter(pk__in=seeded['group_ids'])
+                .values_list('slug', flat=True)
+            ),
+            'post_ids': seeded['post_ids'] or list(
+                Post.objects.values_list('id', flat=True)[:1000]
+            ),
+        }
+
+    def make_request(self, name, rng):
+        """Адрес и данные случайного запроса к странице name."""
+        targets = self.targets
+        if name == 'index':
+            return reverse('posts:index'), None
+        if name == 'group_posts':
+            return reverse('posts:group_list', kwargs={
+                'slug': rng.choice(targets['slugs'])}), None
+        if name == 'profile':
+            return reverse('posts:profile', kwargs={
+                'username': rng.choice(targets['usernames'])}), None
+        if name == 'post_create':
+            data = {'text': f'Нагрузочный пост {rng.random()}'}
+            if targets['group_ids'] and rng.random() < 0.5:
+                data['group'] = rng.choice(targets['group_ids'])
+            return reverse('posts:post_create'), data
+        post_id = rng.choice(targets['post_ids'])
+        if name == 'add_comment':
+            return (
+                reverse('posts:add_comment', kwargs={'post_id': post_id}),
+                {'text': f'Нагрузочный комментарий {rng.random()}'},
+            )
+        return reverse('posts:post_detail', kwargs={'post_id': post_id}), None
+
+    def worker(self, name, requests, seed, options):
+        """Поток со своим клиентом и соединением с базой."""
+        method, login = self.VIEWS[name]
+        rng = random.Random(seed)
+        client = Client()
+        if login:
+            client.force_login(
+                User.objects.get(pk=rng.choice(self.targets['user_ids']))
+            )
+        timings = []
+        queries = []
+        errors = 0
+        try:
+            for _ in range(requests):
+                url, data = self.make_request(name, rng)
+                if options['cold_cache']:
+                    cache.clear()
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, data)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    timings.append(time.perf_counter() - started)
+                queries.append(counter.count)
+                if response.status_code >= 400:
+                    errors += 1
+        finally:
+            connections.close_all()
+        return timings, queries, errors
+
+    def run(self, name, requests, options, seed_offset):
+        concurrency = min(options['concurrency'], requests)
+        shares = [requests // concurrency] * concurrency
+        for i in range(requests % concurrency):
+            shares[i] += 1
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(self.worker, name, share,
+                                options['random_seed'] + seed_offset + i,
+                                options)
+                for i, share in enumerate(shares)
+            ]
+            return [future.result() for future in futures]
+
+    def bench_view(self, name, options):
+        if options['warmup']:
+            self.run(name, options['warmup'], options, seed_offset=1000)
+        rss_before = rss_mb()
+        started = time.perf_counter()
+        parts = self.run(name, options['requests'], options, seed_offset=0)
+        elapsed = time.perf_counter() - started
+        timings = sorted(
+            timing for part_timings, _, _ in parts
+            for timing in part_timings
+        )
+        queries = [count for _, part_queries, _ in parts
+                   for count in part_queries]
+        result = {
+            'requests': len(timings),
+            'errors': sum(errors for _, _, errors in parts),
+            'rps': round(len(timings) / elapsed, 1),
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 2),
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+            'rss_mb': round(rss_mb(), 1),
+            'rss_growth_mb': round(rss_mb() - rss_before, 1),
+        }
+        for percent in PERCENTILES:
+            result[f'p{percent}_ms'] = round(
+                percentile(timings, percent) * 1000, 2
+            )
+        return result
+
+    def report(self, name, result, baseline):
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        line = ', '.join(
+            f'p{percent} {result[f"p{percent}_ms"]} мс'
+            for percent in PERCENTILES
+        )
+        self.stdout.write(
+            f'  {line}; {result["rps"]} запр./с; запросов к базе '
+            f'{result["queries_mean"]} (макс. {result["queries_max"]}); '
+            f'RSS {result["rss_mb"]} МБ; ошибок {result["errors"]}'
+        )
+        previous = (baseline or {}).get(name)
+        if not previous:
+            return
+        changes = []
+        for key in (*(f'p{percent}_ms' for percent in PERCENTILES),
+                    'queries_mean'):
+            if previous.get(key):
+                change = (result[key] - previous[key]) / previous[key]
+                changes.append(f'{key} {change:+.0%}')
+        self.stdout.write(f'  против прошлого замера: {", ".join(changes)}')
@@ -0,0 +1,87 @@
+import codecs
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from posts import exporter
+
+
+def date_argument(value):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return day
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает посты, комментарии или группы в NDJSON или CSV '
+        'с постоянным расходом памяти.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', choices=sorted(exporter.EXPORTS), default='posts',
+        )
+        parser.add_argument(
+            '--format', choices=exporter.FORMATS, default=exporter.NDJSON,
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл выгрузки; «-» — стандартный вывод. '
+                 'Файл с расширением .gz сжимается.',
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжать выгрузку gzip.',
+        )
+        parser.add_argument(
+            '--since', type=date_argument,
+            help='Первый день выгрузки, ГГГГ-ММ-ДД.',
+        )
+        parser.add_argument(
+            '--until', type=date_argument,
+            help='Последний день выгрузки, ГГГГ-ММ-ДД.',
+        )
+        parser.add_argument('--group', help='Адрес (slug) группы.')
+        parser.add_argument('--author', help='Имя автора.')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if output == '-' and options['gzip']:
+            raise CommandError(
+                'Сжатая выгрузка пишется только в файл: --output '
+                'export.ndjson.gz.'
+            )
+        try:
+            chunks = exporter.stream(
+                options['model'],
+                options['format'],
+                compress=options['gzip'] or output.endswith('.gz'),
+                since=options['since'],
+                until=options['until'],
+                group=options['group'],
+                author=options['author'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        if output == '-':
+            self.write_text(chunks)
+            return
+        try:
+            with open(output, 'wb') as file:
+                self.write(chunks, file)
+        except OSError as error:
+            raise CommandError(error)
+
+    def write(self, chunks, file):
+        for chunk in chunks:
+            file.write(chunk)
+        file.flush()
+
+    def write_text(self, chunks):
+        """Пишет выгрузку в self.stdout; куски режутся и посреди символа."""
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in chunks:
+            self.stdout.write(decoder.decode(chunk), ending='')
+        self.stdout.write(decoder.decode(b'', final=True), ending='')
+        self.stdout.flush()
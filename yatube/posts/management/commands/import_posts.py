@@ -0,0 +1,56 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты из файла NDJSON пачками через bulk_create и '
+        'одним проходом обновляет счетчики, кэш лент, ленты подписчиков, '
+        'поисковый индекс и миниатюры.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл NDJSON; «-» — стандартный ввод.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=importer.BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--create-authors',
+            action='store_true',
+            help='Создавать неизвестных авторов без пароля.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['path'] == '-':
+            result = self.run(sys.stdin, options)
+        else:
+            try:
+                with open(options['path'], encoding='utf-8') as lines:
+                    result = self.run(lines, options)
+            except OSError as error:
+                raise CommandError(error)
+        for error in result.errors:
+            self.stderr.write(f'Строка {error["line"]}: {error["error"]}')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано постов: {result.created}, с ошибками: '
+            f'{result.failed}, за {elapsed:.1f} с'
+        ))
+
+    def run(self, lines, options):
+        return importer.import_posts(
+            lines,
+            batch_size=options['batch_size'],
+            create_authors=options['create_authors'],
+            progress=self.progress,
+        )
+
+    def progress(self, created, failed):
+        self.stdout.write(f'  создано {created}, ошибок {failed}')
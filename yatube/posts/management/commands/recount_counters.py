@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счетчики постов и комментариев '
+        'и исправляет расхождения с данными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя.',
+        )
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile(dry_run=options['dry_run'])
+        for key, (stored, actual) in sorted(drift.items()):
+            self.stdout.write(f'{key}: {stored} -> {actual}')
+        verb = 'Найдено' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} расхождений: {len(drift)}'
+        ))
@@ -0,0 +1,125 @@
+import logging
+import multiprocessing
+import os
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import make_thumbnail
+
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    django.setup()
+    connections.close_all()
+
+
+def _warm_chunk(post_ids):
+    """
+    Готовит миниатюры пачки постов; возвращает (готово, пропущено,
+    ошибок). Пропускаются посты, которые успели удалить или оставить
+    без картинки.
+    """
+    done = skipped = failed = 0
+    for post_id in post_ids:
+        try:
+            url = make_thumbnail(post_id)
+        except Exception:
+            logger.exception(
+                'Не удалось подготовить миниатюру поста %s', post_id
+            )
+            failed += 1
+            continue
+        if url is None:
+            skipped += 1
+        else:
+            done += 1
+    return done, skipped, failed
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит миниатюры картинок всех постов в нескольких процессах. '
+        'Обязательна после миграции 0022_post_thumbnail на базе с '
+        'картинками: у старых постов миниатюр нет. Посты с готовой '
+        'миниатюрой пропускаются, поэтому прерванный запуск можно '
+        'просто повторить.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1,
+            help='Число процессов, по умолчанию — число ядер; '
+                 'при 1 миниатюры готовятся в текущем процессе.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=50,
+            help='Сколько постов отдавать процессу за раз.',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать и уже готовые миниатюры.',
+        )
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1 or options['chunk_size'] < 1:
+            raise CommandError(
+                'Нужны хотя бы один процесс и один пост в порции.'
+            )
+        posts = Post.objects.exclude(image='').order_by('id')
+        if not options['force']:
+            posts = posts.filter(thumbnail='')
+        post_ids = list(posts.values_list('id', flat=True))
+        total = len(post_ids)
+        if not total:
+            self.stdout.write('Все миниатюры уже готовы.')
+            return
+        chunk_size = options['chunk_size']
+        chunks = [
+            post_ids[i:i + chunk_size] for i in range(0, total, chunk_size)
+        ]
+        self.stdout.write(
+            f'Постов с картинками: {total}, '
+            f'процессов: {options["processes"]}'
+        )
+        started = time.monotonic()
+        done = skipped = failed = 0
+        for chunk_done, chunk_skipped, chunk_failed in self.warm(
+                chunks, options):
+            done += chunk_done
+            skipped += chunk_skipped
+            failed += chunk_failed
+            self.report(done + skipped + failed, total, started)
+        elapsed = time.monotonic() - started
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, ошибок: {failed}, пропущено: {skipped}, '
+            f'время: {elapsed:.1f} с, '
+            f'{total / elapsed:.1f} постов/с'
+        ))
+
+    def warm(self, chunks, options):
+        if options['processes'] == 1:
+            yield from map(_warm_chunk, chunks)
+            return
+        connections.close_all()
+        with multiprocessing.Pool(
+            options['processes'], initializer=_init_worker
+        ) as pool:
+            yield from pool.imap_unordered(_warm_chunk, chunks)
+
+    def report(self, processed, total, started):
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0
+        eta = (total - processed) / rate if rate else 0
+        self.stdout.write(
+            f'{processed}/{total} ({processed * 100 // total}%), '
+            f'{rate:.1f} постов/с, осталось ~{eta:.0f} с',
+            ending='\r',
+        )
+        self.stdout.flush()
@@ -0,0 +1,78 @@
+from django.db import migrations
+
+
+# Схема и первое наполнение поискового индекса записаны здесь целиком,
+# а не берутся из posts.search: миграция должна выполнять тот SQL,
+# который был при ее создании, как бы модуль ни менялся потом.
+
+# Документ поста p: текст, группа, автор и комментарии.
+DOCUMENT_SOURCE = (
+    "SELECT p.id, p.text, COALESCE(g.title, ''), "
+    "u.username || ' ' || u.first_name || ' ' || u.last_name, "
+    "COALESCE((SELECT {comments} FROM posts_comment c "
+    "WHERE c.post_id = p.id), '') "
+    "FROM posts_post p "
+    "JOIN auth_user u ON u.id = p.author_id "
+    "LEFT JOIN posts_group g ON g.id = p.group_id"
+)
+
+SQLITE_OPERATIONS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5("
+    "text, group_title, author, comments, "
+    "tokenize = 'unicode61 remove_diacritics 2', "
+    "prefix = '2 3')",
+    "INSERT INTO posts_search (rowid, text, group_title, author, comments) "
+    + DOCUMENT_SOURCE.format(comments="group_concat(c.text, ' ')"),
+]
+
+POSTGRES_OPERATIONS = [
+    "CREATE TABLE IF NOT EXISTS posts_search ("
+    "post_id integer PRIMARY KEY REFERENCES posts_post (id) "
+    "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS posts_search_document_idx "
+    "ON posts_search USING GIN (document)",
+    "INSERT INTO posts_search (post_id, document) "
+    "SELECT d.id, "
+    "setweight(to_tsvector('russian', d.c1), 'A') || "
+    "setweight(to_tsvector('russian', d.c2), 'B') || "
+    "setweight(to_tsvector('russian', d.c3), 'B') || "
+    "setweight(to_tsvector('russian', d.c4), 'C') FROM ("
+    + DOCUMENT_SOURCE.format(comments="string_agg(c.text, ' ')")
+    + ") AS d (id, c1, c2, c3, c4)",
+]
+
+
+def fts5_available(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        operations = POSTGRES_OPERATIONS
+    elif connection.vendor == 'sqlite' and fts5_available(connection):
+        operations = SQLITE_OPERATIONS
+    else:
+        # Без индекса поиск идет через icontains.
+        return
+    for sql in operations:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_follow_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
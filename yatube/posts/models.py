@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from core.models import CreatedModel
 
 
@@ -24,13 +25,23 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты вместе со всем, что выводит карточка поста в ленте."""
+        return (
+            self.select_related('author', 'group')
+            .prefetch_related('image_variants')
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
         help_text='Текст нового поста',
         max_length=200
     )
-    pub_date = models.DateTimeField(auto_now_add=True)
+    pub_date = models.DateTimeField(default=timezone.now, editable=False)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -51,16 +62,68 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    thumbnail = models.CharField(
+        'Адрес миниатюры',
+        max_length=255,
+        blank=True,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:SHOWN_CHARS_COUNT]
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
 
+class PostImageVariant(models.Model):
+    """Уменьшенная копия картинки поста для srcset."""
+    JPEG = 'JPEG'
+    WEBP = 'WEBP'
+    FORMAT_CHOICES = (
+        (JPEG, 'JPEG'),
+        (WEBP, 'WebP'),
+    )
+    MIME_TYPES = {
+        JPEG: 'image/jpeg',
+        WEBP: 'image/webp',
+    }
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants'
+    )
+    format = models.CharField(
+        'Формат',
+        max_length=4,
+        choices=FORMAT_CHOICES
+    )
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+    url = models.CharField('Адрес', max_length=255)
+
+    def __str__(self):
+        return f'{self.post_id}: {self.width}x{self.height} {self.format}'
+
+    class Meta:
+        ordering = ['width']
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+
+
 class Comment(CreatedModel):
     post = models.ForeignKey(
         Post,
@@ -85,5 +148,89 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ['created']
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_idx'),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+
+
+class Counter(models.Model):
+    """Денормализованный счетчик: число постов, комментариев и т.п."""
+    key = models.CharField(
+        'Ключ счетчика',
+        max_length=64,
+        primary_key=True
+    )
+    value = models.PositiveIntegerField('Значение', default=0)
+
+    def __str__(self):
+        return f'{self.key}={self.value}'
+
+    class Meta:
+        verbose_name = 'Счетчик'
+        verbose_name_plural = 'Счетчики'
+
+
+class Follow(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follower',
+        verbose_name='Подписчик'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='following',
+        verbose_name='Автор'
+    )
+
+    def __str__(self):
+        return f'{self.user} подписан на {self.author}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+            models.CheckConstraint(check=~models.Q(user=models.F('author')),
+                                   name='prevent_self_follow'),
+        ]
+        verbose_name = 'Подписка'
+        verbose_name_plural = 'Подписки'
+
+
+class TimelineEntry(models.Model):
+    """
+    Пост в личной ленте подписчика. Строки пишутся при публикации поста
+    (posts/timeline.py), поэтому лента читается одним диапазоном индекса.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # Копия Post.pub_date: по ней лента сортируется без join.
+    pub_date = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.user}: {self.post_id}'
+
+    class Meta:
+        ordering = ['-pub_date', '-post_id']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
@@ -0,0 +1,241 @@
+import base64
+import binascii
+import json
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from . import counters
+from .models import TimelineEntry
+
+
+NUMBERED: str = 'numbered'
+CURSOR: str = 'cursor'
+
+FEED_ORDERING = ('-pub_date', '-id')
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+COMMENT_ORDERING = ('created', 'id')
+
+
+class CountedPaginator(Paginator):
+    """Paginator, который берет число объектов из счетчика, а не COUNT(*)."""
+
+    def __init__(self, object_list, per_page, count_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return counters.get_count(self.count_key)
+
+
+class CursorPage:
+    """
+    Страница ленты, выбранная по ключу крайнего поста соседней страницы.
+
+    Посты загружаются при первом обращении к странице, поэтому страница,
+    вывод которой взят из кэша, не обращается к базе.
+    """
+
+    def __init__(self, paginator, after_values=None, before_values=None):
+        self.paginator = paginator
+        self.after_values = after_values
+        self.before_values = before_values
+
+    @cached_property
+    def _page(self):
+        """Посты страницы и признаки наличия следующей и предыдущей."""
+        per_page = self.paginator.per_page
+        if self.before_values is not None:
+            rows = self.paginator.fetch(self.before_values, reverse=True)
+            return rows[:per_page][::-1], True, len(rows) > per_page
+        rows = self.paginator.fetch(self.after_values)
+        return (
+            rows[:per_page], len(rows) > per_page,
+            self.after_values is not None,
+        )
+
+    @property
+    def object_list(self):
+        return self._page[0]
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._page[1]
+
+    def has_previous(self):
+        return self._page[2]
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @cached_property
+    def next_cursor(self):
+        if self.has_next():
+            return self.paginator.encode_cursor(self.object_list[-1])
+        return None
+
+    @cached_property
+    def previous_cursor(self):
+        if self.has_previous():
+            return self.paginator.encode_cursor(self.object_list[0])
+        return None
+
+
+class CursorPaginator:
+    """
+    Постраничный вывод без OFFSET и COUNT(*).
+
+    Страница ищется по значениям полей сортировки крайнего поста
+    соседней страницы, поэтому глубокие страницы не медленнее первой.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING,
+                 count_key=None):
+        self.per_page = int(per_page)
+        self.count_key = count_key
+        self.ordering = tuple(ordering)
+        self.object_list = object_list.order_by(*self.ordering)
+        self.fields = [
+            self.object_list.model._meta.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+
+    @cached_property
+    def count(self):
+        if self.count_key is not None:
+            return counters.get_count(self.count_key)
+        return self.object_list.count()
+
+    def encode_cursor(self, obj):
+        if isinstance(obj, dict):
+            # Строка из values(): полям нужен объект с атрибутами.
+            obj = SimpleNamespace(**{
+                field.attname: obj[field.attname] for field in self.fields
+            })
+        values = [
+            field.value_to_string(obj) for field in self.fields
+        ]
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Значения полей сортировки из курсора или None, если он битый."""
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+            if len(values) != len(self.fields):
+                return None
+            return [
+                field.to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            return None
+
+    def keyset_filter(self, values, reverse=False):
+        """
+        Условие «строго после ключа» для сортировки self.ordering.
+
+        Нестрогое ограничение по первому полю дублирует условие, чтобы
+        СУБД читала диапазон индекса, а не объединяла несколько выборок.
+        """
+        condition = Q()
+        equal = Q()
+        bound = None
+        for name, value in zip(self.ordering, values):
+            descending = name.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            field = name.lstrip('-')
+            if bound is None:
+                bound = Q(**{f'{field}__{lookup}e': value})
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return bound & condition
+
+    def fetch(self, values=None, reverse=False):
+        """
+        До per_page + 1 объектов строго после ключа values, а при
+        reverse — строго перед ним, ближайшие к ключу первыми.
+        """
+        queryset = self.object_list
+        if reverse:
+            queryset = queryset.order_by(*self.reversed_ordering())
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(values, reverse))
+        return list(queryset[:self.per_page + 1])
+
+    def reversed_ordering(self):
+        return [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+
+    def get_page(self, after=None, before=None):
+        before_values = self.decode_cursor(before)
+        if before_values is not None:
+            return CursorPage(self, before_values=before_values)
+        return CursorPage(self, after_values=self.decode_cursor(after))
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Личная лента: записи TimelineEntry подписчика, к которым
+    подмешиваются посты pull_posts — посты авторов, чьи посты
+    не раскладываются по лентам, а читаются при запросе.
+    """
+
+    def __init__(self, object_list, per_page, pull_posts=None):
+        super().__init__(object_list, per_page, ordering=TIMELINE_ORDERING)
+        self.pull_paginator = None
+        if pull_posts is not None:
+            self.pull_paginator = CursorPaginator(pull_posts, per_page)
+
+    def fetch(self, values=None, reverse=False):
+        entries = super().fetch(values, reverse)
+        if self.pull_paginator is None:
+            return entries
+        seen = {entry.post_id for entry in entries}
+        entries += [
+            TimelineEntry(post=post, pub_date=post.pub_date)
+            for post in self.pull_paginator.fetch(values, reverse)
+            if post.pk not in seen
+        ]
+        entries.sort(
+            key=lambda entry: (entry.pub_date, entry.post_id),
+            reverse=not reverse,
+        )
+        return entries[:self.per_page + 1]
+
+
+def get_page_obj(request, object_list, view_name, per_page, count_key):
+    """
+    Страница ленты в режиме, выбранном для view в POSTS_PAGINATION.
+
+    Число постов в ленте берется из счетчика count_key.
+    """
+    mode = settings.POSTS_PAGINATION.get(view_name, NUMBERED)
+    if mode == CURSOR:
+        paginator = CursorPaginator(
+            object_list, per_page, count_key=count_key
+        )
+        return paginator.get_page(
+            request.GET.get('after'), request.GET.get('before')
+        )
+    paginator = CountedPaginator(object_list, per_page, count_key)
+    return paginator.get_page(request.GET.get('page'))
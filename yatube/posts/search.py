@@ -0,0 +1,340 @@
+"""
+Полнотекстовый поиск постов.
+
+Для каждого поста хранится документ из текста, названия группы, имени
+автора и комментариев. На SQLite это виртуальная таблица FTS5 с
+ранжированием bm25, на PostgreSQL — столбец tsvector с индексом GIN и
+ранжированием ts_rank. Если ни то ни другое недоступно, поиск идет
+через icontains без индекса.
+
+Документы пересобираются из таблиц постов одним INSERT ... SELECT,
+поэтому сигналы (posts/signals.py) передают только условие на посты,
+которые нужно переиндексировать. Ранжируются SEARCH_CANDIDATES самых
+новых совпадений: так первая страница не зависит от того, сколько
+всего постов нашлось. Админке нужны все совпадения, поэтому
+filter_posts() не ранжирует, а отбирает посты подзапросом к индексу.
+
+Документ поста собирается из всех его комментариев, поэтому после
+нового комментария пост переиндексируется не в запросе, а в фоновом
+потоке после фиксации транзакции: посты копятся
+POSTS_SEARCH_INDEX_DELAY секунд и переиндексируются одной пачкой, так
+что частые комментарии к одному посту стоят одной пересборки.
+Отложенные посты, не дождавшиеся пачки до остановки процесса,
+возвращает в индекс rebuild().
+"""
+import logging
+import re
+import time
+from threading import Lock
+
+from django.conf import settings
+from django.db import connection as default_connection
+from django.db import connections, transaction
+from django.db.models import Q
+
+from . import background
+from .models import Comment, Group, Post, User
+
+
+SEARCH_TABLE: str = 'posts_search'
+SEARCH_CANDIDATES: int = 1000
+# Вес текста, группы, автора и комментариев в ранжировании.
+WEIGHTS = (10.0, 5.0, 5.0, 1.0)
+POSTGRES_CONFIG: str = 'russian'
+
+TOKEN_RE = re.compile(r'\w+')
+# Сколько постов переиндексировать одним запросом.
+INDEX_BATCH_SIZE: int = 500
+
+logger = logging.getLogger(__name__)
+
+_pending = set()
+_pending_lock = Lock()
+
+POST_TABLE = Post._meta.db_table
+GROUP_TABLE = Group._meta.db_table
+USER_TABLE = User._meta.db_table
+COMMENT_TABLE = Comment._meta.db_table
+
+# Столбцы документа поста p; псевдонимы g и u — группа и автор.
+DOCUMENT_SOURCE = (
+    f"SELECT p.id, p.text, COALESCE(g.title, ''), "
+    f"u.username || ' ' || u.first_name || ' ' || u.last_name, "
+    f"COALESCE((SELECT {{comments}} FROM {COMMENT_TABLE} c "
+    f"WHERE c.post_id = p.id), '') "
+    f"FROM {POST_TABLE} p "
+    f"JOIN {USER_TABLE} u ON u.id = p.author_id "
+    f"LEFT JOIN {GROUP_TABLE} g ON g.id = p.group_id "
+    f"WHERE {{where}}"
+)
+
+
+class SearchBackend:
+    """Поиск без индекса: icontains по тексту, группе и автору."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self):
+        pass
+
+    def drop(self):
+        pass
+
+    def index(self, where, params=()):
+        pass
+
+    def unindex(self, post_ids):
+        pass
+
+    def search(self, query, limit=SEARCH_CANDIDATES):
+        return list(
+            self.filter(Post.objects.all(), query)
+            .values_list('id', flat=True)[:limit]
+        )
+
+    def filter(self, queryset, query):
+        condition = Q()
+        for token in TOKEN_RE.findall(query):
+            condition &= (
+                Q(text__icontains=token)
+                | Q(group__title__icontains=token)
+                | Q(author__username__icontains=token)
+            )
+        if not condition:
+            return queryset.none()
+        return queryset.filter(condition)
+
+    def rebuild(self):
+        self.unindex(None)
+        self.index('1 = 1')
+
+    def execute(self, sql, params=()):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            if cursor.description is not None:
+                return cursor.fetchall()
+        return None
+
+
+class SQLiteSearch(SearchBackend):
+    def create(self):
+        self.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+            f'text, group_title, author, comments, '
+            f"tokenize = 'unicode61 remove_diacritics 2', "
+            f"prefix = '2 3')"
+        )
+
+    def drop(self):
+        self.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def index(self, where, params=()):
+        self.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN '
+            f'(SELECT p.id FROM {POST_TABLE} p WHERE {where})',
+            params,
+        )
+        self.execute(
+            f'INSERT INTO {SEARCH_TABLE} '
+            f'(rowid, text, group_title, author, comments) '
+            + DOCUMENT_SOURCE.format(
+                comments="group_concat(c.text, ' ')", where=where
+            ),
+            params,
+        )
+
+    def unindex(self, post_ids):
+        if post_ids is None:
+            self.execute(f'DELETE FROM {SEARCH_TABLE}')
+            return
+        placeholders = ', '.join(['%s'] * len(post_ids))
+        self.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+            list(post_ids),
+        )
+
+    @staticmethod
+    def match(query):
+        # Каждое слово ищется как префикс: так находятся и другие
+        # формы слова, которые без стемминга FTS5 не сводит к одной.
+        return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(query))
+
+    def search(self, query, limit=SEARCH_CANDIDATES):
+        match = self.match(query)
+        if not match:
+            return []
+        weights = ', '.join(map(str, WEIGHTS))
+        rows = self.execute(
+            f'SELECT id FROM ('
+            f'SELECT rowid AS id, bm25({SEARCH_TABLE}, {weights}) AS score '
+            f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+            f'ORDER BY rowid DESC LIMIT %s'
+            f') ORDER BY score, id DESC',
+            [match, limit],
+        )
+        return [post_id for post_id, in rows]
+
+    def filter(self, queryset, query):
+        match = self.match(query)
+        if not match:
+            return queryset.none()
+        return queryset.extra(
+            where=[f'{POST_TABLE}.id IN (SELECT rowid FROM {SEARCH_TABLE} '
+                   f'WHERE {SEARCH_TABLE} MATCH %s)'],
+            params=[match],
+        )
+
+
+class PostgresSearch(SearchBackend):
+    def create(self):
+        self.execute(
+            f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+            f'post_id integer PRIMARY KEY REFERENCES {POST_TABLE} (id) '
+            f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            f'document tsvector NOT NULL)'
+        )
+        self.execute(
+            f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx '
+            f'ON {SEARCH_TABLE} USING GIN (document)'
+        )
+
+    def drop(self):
+        self.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def index(self, where, params=()):
+        weighted = ' || '.join(
+            f"setweight(to_tsvector('{POSTGRES_CONFIG}', d.c{number}), "
+            f"'{label}')"
+            for number, label in enumerate('ABBC', start=1)
+        )
+        self.execute(
+            f'INSERT INTO {SEARCH_TABLE} (post_id, document) '
+            f'SELECT d.id, {weighted} FROM ('
+            + DOCUMENT_SOURCE.format(
+                comments="string_agg(c.text, ' ')", where=where
+            )
+            + ') AS d (id, c1, c2, c3, c4) '
+            'ON CONFLICT (post_id) DO UPDATE '
+            'SET document = EXCLUDED.document',
+            params,
+        )
+
+    def unindex(self, post_ids):
+        if post_ids is None:
+            self.execute(f'DELETE FROM {SEARCH_TABLE}')
+            return
+        self.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE post_id = ANY(%s)',
+            [list(post_ids)],
+        )
+
+    def search(self, query, limit=SEARCH_CANDIDATES):
+        if not TOKEN_RE.search(query):
+            return []
+        rows = self.execute(
+            f'SELECT id FROM ('
+            f'SELECT post_id AS id, ts_rank(document, q) AS score '
+            f'FROM {SEARCH_TABLE}, '
+            f"plainto_tsquery('{POSTGRES_CONFIG}', %s) AS q "
+            f'WHERE document @@ q ORDER BY post_id DESC LIMIT %s'
+            f') AS candidates ORDER BY score DESC, id DESC',
+            [query, limit],
+        )
+        return [post_id for post_id, in rows]
+
+    def filter(self, queryset, query):
+        if not TOKEN_RE.search(query):
+            return queryset.none()
+        return queryset.extra(
+            where=[f'{POST_TABLE}.id IN (SELECT post_id FROM {SEARCH_TABLE} '
+                   f"WHERE document @@ "
+                   f"plainto_tsquery('{POSTGRES_CONFIG}', %s))"],
+            params=[query],
+        )
+
+
+def fts5_available(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def get_backend(connection=None):
+    connection = connection or default_connection
+    if connection.vendor == 'postgresql':
+        return PostgresSearch(connection)
+    if connection.vendor == 'sqlite' and fts5_available(connection):
+        return SQLiteSearch(connection)
+    return SearchBackend(connection)
+
+
+def search(query, limit=SEARCH_CANDIDATES):
+    """id найденных постов, самые подходящие первыми."""
+    return get_backend().search(query, limit)
+
+
+def filter_posts(queryset, query):
+    """Посты queryset, подходящие под query, все и без ранжирования."""
+    return get_backend().filter(queryset, query)
+
+
+def index_posts(post_ids):
+    post_ids = list(post_ids)
+    if post_ids:
+        placeholders = ', '.join(['%s'] * len(post_ids))
+        get_backend().index(f'p.id IN ({placeholders})', post_ids)
+
+
+def _enqueue(post_ids):
+    with _pending_lock:
+        flush_scheduled = bool(_pending)
+        _pending.update(post_ids)
+    if not flush_scheduled:
+        background.get_executor('search', 1).submit(_flush)
+
+
+def _flush():
+    time.sleep(settings.POSTS_SEARCH_INDEX_DELAY)
+    with _pending_lock:
+        post_ids = sorted(_pending)
+        _pending.clear()
+    try:
+        for start in range(0, len(post_ids), INDEX_BATCH_SIZE):
+            index_posts(post_ids[start:start + INDEX_BATCH_SIZE])
+    except Exception:
+        logger.exception('Не удалось переиндексировать посты %s', post_ids)
+    finally:
+        connections.close_all()
+
+
+def schedule_index_posts(post_ids):
+    """
+    Ставит переиндексацию постов в очередь после фиксации транзакции.
+    При POSTS_SEARCH_INDEX_DELAY = 0 посты переиндексируются сразу.
+    """
+    post_ids = set(post_ids)
+    if not post_ids:
+        return
+    if settings.POSTS_SEARCH_INDEX_DELAY:
+        transaction.on_commit(lambda: _enqueue(post_ids))
+    else:
+        index_posts(post_ids)
+
+
+def index_group_posts(group_id):
+    get_backend().index('p.group_id = %s', [group_id])
+
+
+def index_author_posts(author_id):
+    get_backend().index('p.author_id = %s', [author_id])
+
+
+def unindex_posts(post_ids):
+    post_ids = list(post_ids)
+    if post_ids:
+        get_backend().unindex(post_ids)
+
+
+def rebuild():
+    get_backend().rebuild()
@@ -0,0 +1,180 @@
+"""Наполнение базы случайными данными для бенчмарков."""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import Mixer
+
+from . import background
+from .models import Comment, Follow, Group, Post, User
+
+
+BATCH_SIZE: int = 5000
+TEXT_POOL_SIZE: int = 1000
+NO_GROUP_SHARE: float = 0.3
+POST_INTERVAL = timedelta(minutes=1)
+
+
+@contextmanager
+def temporary_database(keepdb=False, name=None):
+    """
+    Переключает соединение на чистую тестовую базу с примененными
+    миграциями, чтобы бенчмарки не трогали рабочие данные.
+
+    name — имя тестовой базы вместо TEST['NAME']. Тестовая база SQLite
+    по умолчанию живет в памяти, и параллельная запись из нескольких
+    потоков в нее падает с «database table is locked», поэтому для
+    нагрузки с записью ей нужен файл.
+
+    Фоновые задачи внутри выполняются сразу, а пулы дожидаются перед
+    переключением в обе стороны: задача, пережившая тестовую базу,
+    открыла бы рабочую и писала бы уже в нее.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if name is not None:
+        test_settings['NAME'] = name
+    background.drain()
+    try:
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb
+        )
+        try:
+            with override_settings(
+                    POSTS_SEARCH_INDEX_DELAY=0,
+                    POSTS_THUMBNAIL_WORKERS=0,
+                    POSTS_TIMELINE_BACKFILL_WORKERS=0):
+                yield
+        finally:
+            background.drain()
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=keepdb
+            )
+    finally:
+        test_settings['NAME'] = old_test_name
+
+
+def _report(progress, name, done, total):
+    if progress is not None:
+        progress(name, done, total)
+
+
+def _bulk_create(model, objects, total, batch_size, progress):
+    batch = []
+    done = 0
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == batch_size:
+            model.objects.bulk_create(batch)
+            done += len(batch)
+            batch = []
+            _report(progress, model._meta.model_name, done, total)
+    if batch:
+        model.objects.bulk_create(batch)
+        done += len(batch)
+        _report(progress, model._meta.model_name, done, total)
+
+
+def seed(posts, authors, groups, comments=0, follows=0, prefix='seed',
+         batch_size=BATCH_SIZE, random_seed=0, progress=None):
+    """
+    Создает authors пользователей, groups групп, posts постов, comments
+    комментариев к случайным постам и по follows подписок на случайных
+    авторов у каждого пользователя.
+
+    Пользователи и группы генерируются mixer, тексты — Faker, все
+    объекты пишутся через bulk_create пачками по batch_size.
+    progress(name, done, total) вызывается после каждой пачки.
+    Возвращает словарь с id созданных пользователей, групп и постов.
+    """
+    rng = random.Random(random_seed)
+    Faker.seed(random_seed)
+    fake = Faker('ru_RU')
+    mixer = Mixer(commit=False)
+
+    _bulk_create(
+        User,
+        mixer.cycle(authors).blend(
+            User, username=mixer.sequence(f'{prefix}_user_{{0}}')
+        ),
+        authors, batch_size, progress,
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith=f'{prefix}_user_')
+        .values_list('id', flat=True)
+    )
+    _bulk_create(
+        Group,
+        mixer.cycle(groups).blend(
+            Group, slug=mixer.sequence(f'{prefix}-group-{{0}}')
+        ),
+        groups, batch_size, progress,
+    )
+    group_ids = list(
+        Group.objects.filter(slug__startswith=f'{prefix}-group-')
+        .values_list('id', flat=True)
+    )
+
+    texts = [
+        fake.text(max_nb_chars=Post._meta.get_field('text').max_length)
+        for _ in range(TEXT_POOL_SIZE)
+    ]
+    first_pub_date = timezone.now() - POST_INTERVAL * posts
+    last_post_id = Post.objects.order_by('-id').values_list(
+        'id', flat=True).first() or 0
+
+    def make_posts():
+        for i in range(posts):
+            group_id = None
+            if group_ids and rng.random() >= NO_GROUP_SHARE:
+                group_id = rng.choice(group_ids)
+            yield Post(
+                author_id=rng.choice(user_ids),
+                group_id=group_id,
+                text=rng.choice(texts),
+                pub_date=first_pub_date + POST_INTERVAL * i,
+            )
+
+    _bulk_create(Post, make_posts(), posts, batch_size, progress)
+    post_ids = list(
+        Post.objects.filter(id__gt=last_post_id)
+        .values_list('id', flat=True)
+    )
+
+    def make_comments():
+        for _ in range(comments):
+            yield Comment(
+                post_id=rng.choice(post_ids),
+                author_id=rng.choice(user_ids),
+                text=rng.choice(texts),
+            )
+
+    if post_ids:
+        _bulk_create(Comment, make_comments(), comments, batch_size,
+                     progress)
+
+    follows = min(follows, len(user_ids) - 1)
+
+    def make_follows():
+        for user_id in user_ids:
+            author_ids = set()
+            while len(author_ids) < follows:
+                author_id = rng.choice(user_ids)
+                if author_id != user_id:
+                    author_ids.add(author_id)
+            for author_id in author_ids:
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    if follows > 0:
+        _bulk_create(Follow, make_follows(), follows * len(user_ids),
+                     batch_size, progress)
+    return {
+        'user_ids': user_ids,
+        'group_ids': group_ids,
+        'post_ids': post_ids,
+    }
@@ -0,0 +1,235 @@
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import counters, feed_cache, search, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw, **kwargs):
+    """
+    Запоминаем автора, группу и картинку поста до сохранения, чтобы
+    сдвинуть их счетчики, сбросить кэш ленты группы и заново
+    подготовить миниатюру замененной картинки.
+    """
+    instance._previous_author_id = None
+    instance._previous_author_username = None
+    instance._previous_group_id = None
+    instance._previous_group_slug = None
+    instance._previous_image = ''
+    if not raw and not instance._state.adding:
+        (instance._previous_author_id, instance._previous_author_username,
+         instance._previous_group_id, instance._previous_group_slug,
+         instance._previous_image) = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('author_id', 'author__username', 'group_id',
+                         'group__slug', 'image')
+            .first()
+            or (None, None, None, None, '')
+        )
+
+
+def _image_changed(instance):
+    return (instance.image.name or '') != getattr(
+        instance, '_previous_image', ''
+    )
+
+
+@receiver(pre_save, sender=Post)
+def reset_changed_thumbnail(sender, instance, raw, **kwargs):
+    """Миниатюра прежней картинки не должна показываться с новой."""
+    if not raw and _image_changed(instance):
+        instance.thumbnail = ''
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change(
+            counters.post_keys(instance.author_id, instance.group_id), 1
+        )
+        return
+    previous_author_id = getattr(instance, '_previous_author_id', None)
+    if previous_author_id not in (None, instance.author_id):
+        counters.change([counters.author_posts_key(previous_author_id)], -1)
+        counters.change([counters.author_posts_key(instance.author_id)], 1)
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        if previous_group_id is not None:
+            counters.change(
+                [counters.group_posts_key(previous_group_id)], -1
+            )
+        if instance.group_id is not None:
+            counters.change([counters.group_posts_key(instance.group_id)], 1)
+
+
+@receiver(post_save, sender=Post)
+def reset_saved_post_feeds(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    previous_group_slug = getattr(instance, '_previous_group_slug', None)
+    previous_author_id = getattr(instance, '_previous_author_id', None)
+    previous_author_scope = None
+    if previous_author_id not in (None, instance.author_id):
+        feed_cache.forget_post_author(instance.pk)
+        previous_author_scope = feed_cache.author_scope(
+            instance._previous_author_username
+        )
+    feed_cache.bump_generations(
+        *feed_cache.post_scopes(instance),
+        feed_cache.group_scope(previous_group_slug)
+        if previous_group_slug else None,
+        previous_author_scope,
+    )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_created_post(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def schedule_changed_thumbnail(sender, instance, raw, **kwargs):
+    if not raw and instance.image and _image_changed(instance):
+        thumbnails.schedule_thumbnail(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw, **kwargs):
+    if not raw:
+        search.index_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.unindex_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change(
+        counters.post_keys(instance.author_id, instance.group_id), -1
+    )
+    counters.forget([counters.post_comments_key(instance.pk)])
+
+
+@receiver(post_delete, sender=Post)
+def reset_deleted_post_feeds(sender, instance, **kwargs):
+    feed_cache.bump_generations(*feed_cache.post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw and instance.post_id is not None:
+        counters.change([counters.post_comments_key(instance.post_id)], 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        counters.change([counters.post_comments_key(instance.post_id)], -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def reset_comment_post_feeds(sender, instance, **kwargs):
+    if not kwargs.get('raw') and instance.post_id is not None:
+        feed_cache.bump_generations(feed_cache.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def index_comment_post(sender, instance, **kwargs):
+    if not kwargs.get('raw') and instance.post_id is not None:
+        search.schedule_index_posts([instance.post_id])
+
+
+@receiver(post_delete, sender=Group)
+def forget_deleted_group(sender, instance, **kwargs):
+    counters.forget([counters.group_posts_key(instance.pk)])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def reset_group_feeds(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        feed_cache.bump_generations(
+            feed_cache.GROUPS, feed_cache.group_scope(instance.slug)
+        )
+
+
+@receiver(post_save, sender=Group)
+def index_group_posts(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        search.index_group_posts(instance.pk)
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    """Посты удаляемой группы останутся без нее; их нужно переиндексировать."""
+    instance._post_ids = list(instance.posts.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def index_ungrouped_posts(sender, instance, **kwargs):
+    search.index_posts(getattr(instance, '_post_ids', []))
+
+
+@receiver(post_save, sender=User)
+def reset_author_feeds(sender, instance, update_fields, raw, **kwargs):
+    """Имя автора выводится во всех лентах; вход на сайт его не меняет."""
+    if raw or update_fields == frozenset(['last_login']):
+        return
+    feed_cache.bump_generations(
+        feed_cache.AUTHORS, feed_cache.author_scope(instance.username)
+    )
+
+
+@receiver(post_save, sender=User)
+def index_author_posts(sender, instance, created, update_fields, raw,
+                       **kwargs):
+    if created or raw or update_fields == frozenset(['last_login']):
+        return
+    search.index_author_posts(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def add_follow(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.change(
+            [counters.author_followers_key(instance.author_id)], 1
+        )
+        timeline.follow(instance.user_id, instance.author_id)
+        feed_cache.bump_generations(feed_cache.user_scope(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def remove_follow(sender, instance, **kwargs):
+    counters.change([counters.author_followers_key(instance.author_id)], -1)
+    timeline.unfollow(instance.user_id, instance.author_id)
+    feed_cache.bump_generations(feed_cache.user_scope(instance.user_id))
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_user(sender, instance, **kwargs):
+    counters.forget([
+        counters.author_posts_key(instance.pk),
+        counters.author_followers_key(instance.pk),
+    ])
+
+
+@receiver(user_logged_in)
+@receiver(user_logged_out)
+def reset_user_pages(sender, user, **kwargs):
+    """
+    Вход меняет токен CSRF в формах страниц пользователя, поэтому их
+    сохраненные у клиента копии больше не годятся.
+    """
+    if user is not None:
+        feed_cache.bump_generations(feed_cache.user_scope(user.pk))
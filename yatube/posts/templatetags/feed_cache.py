@@ -0,0 +1,56 @@
+from django import template
+from django.core.cache import cache
+
+from core import metrics
+from posts import feed_cache
+
+register = template.Library()
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, scopes):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.scopes = scopes
+
+    def render(self, context):
+        scopes = []
+        for expression in self.scopes:
+            value = expression.resolve(context)
+            if isinstance(value, (list, tuple)):
+                scopes.extend(value)
+            elif value:
+                scopes.append(value)
+        key = feed_cache.fragment_key(
+            self.fragment_name, scopes, context['request']
+        )
+        content = cache.get(key)
+        metrics.count_cache('fragment', content is not None)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, feed_cache.FEED_CACHE_TIMEOUT)
+        return content
+
+
+@register.tag
+def feedcache(parser, token):
+    """
+    Кэширует фрагмент шаблона под поколениями областей ленты:
+
+        {% feedcache имя_фрагмента области %} ... {% endfeedcache %}
+
+    Области — переменные шаблона со строкой или списком строк.
+    Фрагмент не должен зависеть от пользователя.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} требует имя фрагмента.'
+        )
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    return FeedCacheNode(
+        nodelist,
+        bits[1],
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
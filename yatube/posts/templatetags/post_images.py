@@ -0,0 +1,37 @@
+from django import template
+
+from posts.models import PostImageVariant
+from posts.thumbnails import THUMBNAIL_HEIGHT, THUMBNAIL_WIDTH
+
+register = template.Library()
+
+IMAGE_SIZES: str = f'(min-width: 992px) {THUMBNAIL_WIDTH}px, 100vw'
+
+
+@register.inclusion_tag('posts/includes/thumbnail.html')
+def post_thumbnail(post):
+    """
+    Готовая миниатюра поста или заглушка, пока она готовится.
+    Варианты картинки выводятся в <picture> с srcset по ширине.
+    """
+    srcsets = {}
+    for variant in post.image_variants.all():
+        srcsets.setdefault(variant.format, []).append(
+            f'{variant.url} {variant.width}w'
+        )
+    sources = [
+        {
+            'type': PostImageVariant.MIME_TYPES[image_format],
+            'srcset': ', '.join(srcsets[image_format]),
+        }
+        for image_format in (PostImageVariant.WEBP,)
+        if image_format in srcsets
+    ]
+    return {
+        'post': post,
+        'sources': sources,
+        'srcset': ', '.join(srcsets.get(PostImageVariant.JPEG, [])),
+        'sizes': IMAGE_SIZES,
+        'width': THUMBNAIL_WIDTH,
+        'height': THUMBNAIL_HEIGHT,
+    }
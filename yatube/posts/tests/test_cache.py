@@ -0,0 +1,114 @@
+import itertools
+import shutil
+import tempfile
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post, User
+from posts.tests import test_views
+from yatube.env import cache_config
+
+
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+SHARED_CACHES = {
+    'default': cache_config(f'file://{TEMP_CACHE_DIR}', key_prefix='test'),
+}
+
+
+class WorkerClient(Client):
+    """
+    Клиент, запросы которого по очереди обслуживают два воркера.
+
+    Каждый запрос получает новый экземпляр бэкенда кэша, как в отдельном
+    процессе. Локальная память у каждого воркера своя, остальные бэкенды
+    общие, как у воркеров gunicorn на одном сервере.
+    """
+    workers: int = 2
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.worker_caches = itertools.cycle([
+            self.worker_cache_config(number)
+            for number in range(self.workers)
+        ])
+
+    @staticmethod
+    def worker_cache_config(number):
+        config = dict(settings.CACHES['default'])
+        if config['BACKEND'].endswith('LocMemCache'):
+            config['LOCATION'] = f'{config.get("LOCATION", "")}-{number}'
+        return {'default': config}
+
+    def request(self, **request):
+        with override_settings(CACHES=next(self.worker_caches)):
+            return super().request(**request)
+
+
+class CacheConfigTests(SimpleTestCase):
+    def test_cache_config_from_url(self):
+        """Бэкенд и его адрес берутся из URL кэша."""
+        urls = {
+            'locmem://': (
+                'django.core.cache.backends.locmem.LocMemCache', ''),
+            'file:///tmp/yatube': (
+                'django.core.cache.backends.filebased.FileBasedCache',
+                '/tmp/yatube'),
+            'db://yatube_cache': (
+                'django.core.cache.backends.db.DatabaseCache',
+                'yatube_cache'),
+            'memcached://10.0.0.1:11211,10.0.0.2:11211': (
+                'django.core.cache.backends.memcached.MemcachedCache',
+                ['10.0.0.1:11211', '10.0.0.2:11211']),
+        }
+        for url, (backend, location) in urls.items():
+            with self.subTest(url=url):
+                config = cache_config(url, key_prefix='prod', version='3')
+                self.assertEqual(config['BACKEND'], backend)
+                self.assertEqual(config['LOCATION'], location)
+                self.assertEqual(config['KEY_PREFIX'], 'prod')
+                self.assertEqual(config['VERSION'], 3)
+
+    def test_unknown_cache_backend(self):
+        with self.assertRaises(ValueError):
+            cache_config('unknown://')
+
+
+class LocalMemoryWorkersTests(TestCase):
+    @override_settings(CACHES={'default': cache_config('locmem://workers')})
+    def test_local_memory_is_not_shared_between_workers(self):
+        """В памяти процесса каждый воркер видит только свой кэш."""
+        cache.clear()
+        author = User.objects.create_user(username='test_user')
+        client = WorkerClient()
+        client.get(reverse('posts:index'))
+        Post.objects.create(author=author, text='Fresh post')
+        self.assertContains(client.get(reverse('posts:index')), 'Fresh post')
+        self.assertNotContains(
+            client.get(reverse('posts:index')), 'Fresh post'
+        )
+
+
+class SharedCacheMixin:
+    """Тесты кэша страниц на двух воркерах с общим файловым кэшем."""
+    client_class = WorkerClient
+
+    @classmethod
+    def setUpClass(cls):
+        cls._shared_cache = override_settings(CACHES=SHARED_CACHES)
+        cls._shared_cache.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._shared_cache.disable()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+
+class SharedIndexCacheTests(SharedCacheMixin, test_views.IndexCacheTests):
+    pass
+
+
+class SharedPageCacheTests(SharedCacheMixin, test_views.PageCacheTests):
+    pass
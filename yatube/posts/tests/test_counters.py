@@ -0,0 +1,101 @@
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from posts import counters
+from posts.models import Post, Group, Comment, Counter, User
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='Test group',
+            slug='test_slug',
+            description='Test description',
+        )
+        cls.other_group = Group.objects.create(
+            title='Other group',
+            slug='other_slug',
+            description='Other description',
+        )
+
+    def setUp(self):
+        self.post = Post.objects.create(
+            author=self.author,
+            text='Test post',
+            group=self.group,
+        )
+        self.keys = {
+            counters.POSTS: Post.objects.all(),
+            counters.author_posts_key(self.author.pk): self.author.posts,
+            counters.group_posts_key(self.group.pk): self.group.posts,
+            counters.group_posts_key(self.other_group.pk):
+                self.other_group.posts,
+            counters.post_comments_key(self.post.pk): self.post.comments,
+        }
+        for key in self.keys:
+            counters.get_count(key)
+
+    def assertCountersMatch(self):
+        for key, queryset in self.keys.items():
+            with self.subTest(key=key):
+                self.assertEqual(counters.get_count(key), queryset.count())
+
+    def test_missing_counter_is_computed_and_stored(self):
+        """Отсутствующий счетчик вычисляется и сохраняется."""
+        Counter.objects.all().delete()
+        key = counters.author_posts_key(self.author.pk)
+        self.assertEqual(counters.get_count(key), 1)
+        self.assertTrue(Counter.objects.filter(key=key, value=1).exists())
+
+    def test_missing_counter_is_created_on_change(self):
+        """
+        Изменение отсутствующего счетчика создает его по таблице, так что
+        новый пост не теряется, пока счетчик еще не прочитан.
+        """
+        Counter.objects.all().delete()
+        Post.objects.create(author=self.author, text='New post')
+        self.assertTrue(Counter.objects.filter(
+            key=counters.author_posts_key(self.author.pk), value=2
+        ).exists())
+        self.assertCountersMatch()
+
+    def test_counters_follow_post_changes(self):
+        """Счетчики следуют за созданием, правкой и удалением постов."""
+        Post.objects.create(author=self.author, text='New post')
+        self.assertCountersMatch()
+        self.post.group = self.other_group
+        self.post.save()
+        self.assertCountersMatch()
+        self.post.delete()
+        self.assertCountersMatch()
+
+    def test_counters_follow_author_change(self):
+        """После смены автора поста счетчики обоих авторов верны."""
+        other = User.objects.create_user(username='other_user')
+        self.keys[counters.author_posts_key(other.pk)] = other.posts
+        counters.get_count(counters.author_posts_key(other.pk))
+        self.post.author = other
+        self.post.save()
+        self.assertCountersMatch()
+
+    def test_counters_follow_comment_changes(self):
+        """Счетчик комментариев следует за комментариями поста."""
+        comment = Comment.objects.create(
+            post=self.post, author=self.author, text='Comment'
+        )
+        self.assertCountersMatch()
+        comment.delete()
+        self.assertCountersMatch()
+
+    def test_recount_counters_fixes_drift(self):
+        """Команда recount_counters исправляет разошедшиеся счетчики."""
+        Counter.objects.filter(key=counters.POSTS).update(value=100)
+        out = StringIO()
+        call_command('recount_counters', '--dry-run', stdout=out)
+        self.assertIn(f'{counters.POSTS}: 100 -> 1', out.getvalue())
+        self.assertEqual(counters.get_count(counters.POSTS), 100)
+        call_command('recount_counters', stdout=StringIO())
+        self.assertCountersMatch()
@@ -0,0 +1,150 @@
+import csv
+import gzip
+import json
+import shutil
+import tempfile
+from datetime import datetime
+from io import StringIO
+from django.conf import settings
+from django.contrib.admin import ACTION_CHECKBOX_NAME
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from posts import exporter, importer
+from posts.models import Comment, Group, Post, User
+
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class ExporterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.group = Group.objects.create(
+            title='Кошки', slug='cats', description='Test description'
+        )
+        self.posts = [
+            Post.objects.create(
+                author=self.author, group=self.group, text='Котята спят',
+                pub_date=timezone.make_aware(datetime(2021, 5, 1, 12)),
+            ),
+            Post.objects.create(
+                author=self.other, text='Щенки играют',
+                pub_date=timezone.make_aware(datetime(2021, 5, 3, 12)),
+            ),
+        ]
+        self.comment = Comment.objects.create(
+            post=self.posts[0], author=self.other, text='Прелесть'
+        )
+
+    def export(self, name='posts', export_format=exporter.NDJSON,
+               **filters):
+        return b''.join(
+            exporter.stream(name, export_format, **filters)
+        ).decode()
+
+    def test_ndjson(self):
+        rows = [json.loads(line)
+                for line in self.export().splitlines()]
+        self.assertEqual(rows[0], {
+            'id': self.posts[0].pk,
+            'author': 'author',
+            'group': 'cats',
+            'text': 'Котята спят',
+            'pub_date': '2021-05-01T12:00:00+00:00',
+            'image': '',
+        })
+        self.assertEqual([row['id'] for row in rows],
+                         [post.pk for post in self.posts])
+
+    def test_csv(self):
+        rows = list(csv.reader(
+            self.export('comments', exporter.CSV).splitlines()
+        ))
+        self.assertEqual(
+            rows[0], ['id', 'post', 'author', 'text', 'created']
+        )
+        self.assertEqual(
+            rows[1][:4],
+            [str(self.comment.pk), str(self.posts[0].pk), 'other',
+             'Прелесть']
+        )
+
+    def test_filters(self):
+        cases = (
+            ({'since': datetime(2021, 5, 2).date()}, [self.posts[1]]),
+            ({'until': datetime(2021, 5, 1).date()}, [self.posts[0]]),
+            ({'group': 'cats'}, [self.posts[0]]),
+            ({'author': 'other'}, [self.posts[1]]),
+        )
+        for filters, posts in cases:
+            with self.subTest(filters=filters):
+                rows = [json.loads(line)
+                        for line in self.export(**filters).splitlines()]
+                self.assertEqual([row['id'] for row in rows],
+                                 [post.pk for post in posts])
+        with self.assertRaises(ValueError):
+            self.export('groups', author='other')
+
+    def test_export_can_be_imported(self):
+        """Выгрузка постов загружается обратно без изменений."""
+        lines = self.export().splitlines()
+        Post.objects.all().delete()
+        result = importer.import_posts(lines)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(
+            list(Post.objects.order_by('id').values_list(
+                'author__username', 'group__slug', 'text', 'pub_date'
+            )),
+            [(post.author.username, post.group and post.group.slug,
+              post.text, post.pub_date) for post in self.posts]
+        )
+
+    def test_command(self):
+        path = f'{TEMP_DIR}/posts.ndjson.gz'
+        call_command('export_posts', output=path, author='author')
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual([row['id'] for row in rows], [self.posts[0].pk])
+        with self.assertRaises(CommandError):
+            call_command('export_posts', '--model=groups',
+                         '--since=2021-05-01')
+
+    def test_command_writes_to_stdout(self):
+        """Без --output выгрузка идет в stdout команды."""
+        out = StringIO()
+        call_command('export_posts', '--format=csv', stdout=out)
+        rows = list(csv.reader(out.getvalue().splitlines()))
+        self.assertEqual(rows[1][3], 'Котята спят')
+        with self.assertRaises(CommandError):
+            call_command('export_posts', '--gzip', stdout=StringIO())
+
+    def test_admin_action(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.post(reverse('admin:posts_post_changelist'), {
+            'action': 'export_csv',
+            ACTION_CHECKBOX_NAME: [self.posts[1].pk],
+        })
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="posts.csv"')
+        rows = list(csv.reader(
+            b''.join(response.streaming_content).decode().splitlines()
+        ))
+        self.assertEqual([row[0] for row in rows[1:]],
+                         [str(self.posts[1].pk)])
@@ -0,0 +1,149 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts import counters, timeline
+from posts.models import Follow, Post, TimelineEntry, User
+from posts.views import SHOWN_POSTS_NUMBER
+
+
+FOLLOW_INDEX = 'posts:follow_index'
+
+
+class FollowTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.stranger = User.objects.create_user(username='stranger')
+
+    def setUp(self):
+        cache.clear()
+        self.auth_user = Client()
+        self.auth_user.force_login(self.reader)
+
+    def follow(self, author):
+        self.auth_user.get(reverse(
+            'posts:profile_follow', kwargs={'username': author.username}
+        ))
+
+    def unfollow(self, author):
+        self.auth_user.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': author.username}
+        ))
+
+    def get_feed(self, **params):
+        response = self.auth_user.get(reverse(FOLLOW_INDEX), params)
+        return [entry.post for entry in response.context['page_obj']]
+
+    def test_follow_and_unfollow(self):
+        """Подписка создается один раз, на себя подписаться нельзя."""
+        self.follow(self.author)
+        self.follow(self.author)
+        self.follow(self.reader)
+        self.assertEqual(
+            list(Follow.objects.values_list('user', 'author')),
+            [(self.reader.pk, self.author.pk)]
+        )
+        self.assertEqual(counters.get_count(
+            counters.author_followers_key(self.author.pk)), 1)
+        self.unfollow(self.author)
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(counters.get_count(
+            counters.author_followers_key(self.author.pk)), 0)
+
+    def test_feed_shows_followed_authors_only(self):
+        """В ленте посты авторов из подписок, старые и новые."""
+        old_post = Post.objects.create(author=self.author, text='Old post')
+        self.follow(self.author)
+        new_post = Post.objects.create(author=self.author, text='New post')
+        Post.objects.create(author=self.stranger, text='Stranger post')
+        self.assertEqual(self.get_feed(), [new_post, old_post])
+        self.unfollow(self.author)
+        self.assertEqual(self.get_feed(), [])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_feed_pages(self):
+        """Лента листается курсором в обе стороны."""
+        self.follow(self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Post #{i}')
+            for i in range(SHOWN_POSTS_NUMBER + 3)
+        ][::-1]
+        response = self.auth_user.get(reverse(FOLLOW_INDEX))
+        page_obj = response.context['page_obj']
+        self.assertEqual(
+            [entry.post for entry in page_obj], posts[:SHOWN_POSTS_NUMBER]
+        )
+        next_page = self.get_feed(after=page_obj.next_cursor)
+        self.assertEqual(next_page, posts[SHOWN_POSTS_NUMBER:])
+
+    @override_settings(POSTS_TIMELINE_PUSH_MAX_FOLLOWERS=1)
+    def test_popular_author_posts_are_merged_on_read(self):
+        """
+        Посты автора с большим числом подписчиков не раскладываются,
+        а подмешиваются при чтении ленты.
+        """
+        Follow.objects.create(user=self.stranger, author=self.author)
+        self.follow(self.author)
+        self.follow(self.stranger)
+        author_post = Post.objects.create(author=self.author, text='Popular')
+        stranger_post = Post.objects.create(
+            author=self.stranger, text='Stranger post'
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=author_post).exists()
+        )
+        self.assertEqual(timeline.pull_author_ids(self.reader),
+                         [self.author.pk])
+        self.assertEqual(self.get_feed(), [stranger_post, author_post])
+
+    @override_settings(POSTS_TIMELINE_PUSH_MAX_FOLLOWERS=1,
+                       POSTS_TIMELINE_BACKFILL_WORKERS=0)
+    def test_author_back_to_fan_out_gets_backfilled(self):
+        """Когда подписчиков снова мало, ленты дополняются постами."""
+        Follow.objects.create(user=self.stranger, author=self.author)
+        self.follow(self.author)
+        post = Post.objects.create(author=self.author, text='Popular')
+        Follow.objects.filter(user=self.stranger).delete()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.get_feed(), [post])
+
+    @override_settings(POSTS_TIMELINE_PUSH_MAX_FOLLOWERS=1,
+                       POSTS_TIMELINE_BACKFILL_WORKERS=1)
+    def test_backfill_runs_after_unfollow_request(self):
+        """Запрос отписки не дополняет ленты сам: это делает фоновая задача."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.auth_user.force_login(self.stranger)
+        self.follow(self.author)
+        post = Post.objects.create(author=self.author, text='Popular')
+        self.unfollow(self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        timeline.backfill_author(self.author.pk)
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user', 'post')),
+            [(self.reader.pk, post.pk)]
+        )
+
+    def test_rebuild(self):
+        """Пересборка лент дает те же записи, что и сигналы."""
+        self.follow(self.author)
+        for i in range(3):
+            Post.objects.create(author=self.author, text=f'Post #{i}')
+        entries = set(TimelineEntry.objects.values_list('user', 'post'))
+        timeline.rebuild()
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('user', 'post')), entries
+        )
+
+    def test_follow_index_query_budget(self):
+        """Лента читается одним диапазоном при любом числе постов."""
+        self.follow(self.author)
+        for i in range(SHOWN_POSTS_NUMBER * 2):
+            Post.objects.create(author=self.author, text=f'Post #{i}')
+        self.auth_user.get(reverse(FOLLOW_INDEX))
+        # Сессия, пользователь, подписки, счетчики подписчиков,
+        # страница ленты и варианты картинок.
+        with self.assertNumQueries(6):
+            self.auth_user.get(reverse(FOLLOW_INDEX))
@@ -1,10 +1,12 @@
 import os
 import shutil
 import tempfile
+from io import BytesIO
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile as suf
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 from posts.models import Post, Group, Comment, User
 
 
@@ -218,3 +220,140 @@ class CommentFormTest(TestCase):
         self.assertFalse(Comment.objects.filter(
             text=form_data['text']
         ).exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadLimitTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.auth_user = Client()
+        self.auth_user.force_login(self.author)
+
+    @staticmethod
+    def make_jpeg(size, exif=None):
+        buffer = BytesIO()
+        options = {'exif': exif} if exif else {}
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', **options)
+        return suf('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def create_post(self, image):
+        return self.auth_user.post(reverse('posts:post_create'), data={
+            'text': 'Photo post',
+            'image': image,
+        })
+
+    @override_settings(POSTS_IMAGE_MAX_BYTES=100)
+    def test_too_large_file_is_rejected(self):
+        """Файл больше POSTS_IMAGE_MAX_BYTES не принимается."""
+        response = self.create_post(self.make_jpeg((64, 64)))
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 100\xa0байт.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_are_rejected(self):
+        """Размеры картинки проверяются по заголовку."""
+        response = self.create_post(self.make_jpeg((20, 10)))
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка 20×10 слишком большая: '
+            'допускается не больше 100 пикселей.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_not_an_image_is_rejected(self):
+        """Файл, который не читается как картинка, не принимается."""
+        response = self.create_post(
+            suf('photo.jpg', b'not an image', content_type='image/jpeg')
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors['image'])
+        self.assertFalse(Post.objects.exists())
+
+    def test_csrf_is_checked(self):
+        """Замена обработчиков загрузки не отключает проверку CSRF."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        response = client.post(
+            reverse('posts:post_create'), data={'text': 'Photo post'}
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=32)
+    def test_image_is_reencoded(self):
+        """Картинка пересохраняется без EXIF и уменьшается."""
+        exif = Image.Exif()
+        exif[0x0110] = 'Secret camera'
+        self.create_post(self.make_jpeg((128, 64), exif=exif.tobytes()))
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/photo.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (32, 16))
+            self.assertEqual(len(image.getexif()), 0)
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=32)
+    def test_mpo_is_reencoded_as_jpeg(self):
+        """
+        Снимок MPO с камеры телефона многокадровый, но пересохраняется
+        в JPEG без EXIF и уменьшается, как обычный JPEG.
+        """
+        exif = Image.Exif()
+        exif[0x0110] = 'Secret camera'
+        frames = [Image.new('RGB', (128, 64), color)
+                  for color in ('red', 'blue')]
+        buffer = BytesIO()
+        frames[0].save(buffer, 'MPO', save_all=True,
+                       append_images=frames[1:], exif=exif.tobytes())
+        self.create_post(
+            suf('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+        )
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (32, 16))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_large_png_is_rejected(self):
+        """
+        PNG декодируется целиком, поэтому для него предел пикселей
+        меньше, чем для JPEG.
+        """
+        buffer = BytesIO()
+        Image.new('1', (6000, 4000)).save(buffer, 'PNG')
+        response = self.create_post(
+            suf('huge.png', buffer.getvalue(), content_type='image/png')
+        )
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка 6000×4000 слишком большая: '
+            'допускается не больше '
+            f'{settings.POSTS_IMAGE_MAX_DECODED_PIXELS} пикселей.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=32)
+    def test_animated_gif_is_kept(self):
+        """Анимированная картинка сохраняется как есть, со всеми кадрами."""
+        frames = [Image.new('P', (64, 64), color) for color in (1, 2)]
+        buffer = BytesIO()
+        frames[0].save(buffer, 'GIF', save_all=True,
+                       append_images=frames[1:])
+        self.create_post(
+            suf('anim.gif', buffer.getvalue(), content_type='image/gif')
+        )
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertTrue(image.is_animated)
+            self.assertEqual(image.n_frames, 2)
+            self.assertEqual(image.size, (64, 64))
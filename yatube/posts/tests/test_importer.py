@@ -0,0 +1,184 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from posts import counters, feed_cache, importer, search
+from posts.models import Follow, Group, Post, TimelineEntry, User
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def ndjson(*rows):
+    return [json.dumps(row, ensure_ascii=False) for row in rows]
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImporterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(
+            title='Кошки', slug='cats', description='Test description'
+        )
+
+    def test_posts_are_created_in_batches(self):
+        rows = ndjson(*(
+            {'author': 'author', 'text': f'Котенок #{i}'} for i in range(5)
+        ))
+        result = importer.import_posts(rows, batch_size=2)
+        self.assertEqual((result.created, result.failed), (5, 0))
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            [f'Котенок #{i}' for i in range(5)]
+        )
+
+    def test_concurrent_posts_are_left_out(self):
+        """Посты, опубликованные во время загрузки, проход не трогает."""
+        concurrent = []
+
+        def publish(created, failed):
+            if not concurrent:
+                concurrent.append(Post.objects.create(
+                    author=self.reader, text='Свой пост'
+                ))
+
+        loader = importer.Importer(batch_size=1)
+        loader.run(ndjson(
+            {'author': 'author', 'text': 'Первый'},
+            {'author': 'author', 'text': 'Второй'},
+        ), publish)
+        imported = [
+            post_id for first_id, last_id in loader.id_ranges
+            for post_id in range(first_id, last_id + 1)
+        ]
+        self.assertEqual(
+            sorted(imported),
+            sorted(Post.objects.filter(author=self.author)
+                   .values_list('id', flat=True))
+        )
+        self.assertNotIn(concurrent[0].pk, imported)
+
+    def test_fields(self):
+        importer.import_posts(ndjson({
+            'author': 'author',
+            'text': 'Котята спят',
+            'group': 'cats',
+            'pub_date': '2021-05-01T12:00:00+03:00',
+        }))
+        post = Post.objects.get()
+        self.assertEqual(post.author, self.author)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.isoformat(),
+                         '2021-05-01T09:00:00+00:00')
+
+    def test_errors_are_reported_by_line(self):
+        rows = [
+            'не JSON',
+            '[]',
+            *ndjson(
+                {'author': 'author'},
+                {'author': 'author', 'text': 'x' * 201},
+                {'text': 'Без автора'},
+                {'author': 'missing', 'text': 'Неизвестный автор'},
+                {'author': 'author', 'text': 'Нет группы', 'group': 'dogs'},
+                {'author': 'author', 'text': 'Дата', 'pub_date': 'вчера'},
+                {'author': 'author', 'text': 'Нет файла',
+                 'image': 'posts/missing.gif'},
+                {'author': 'author', 'text': 'Чужой файл',
+                 'image': '../settings.py'},
+            ),
+            '',
+            *ndjson({'author': 'author', 'text': 'Хороший пост'}),
+        ]
+        result = importer.import_posts(rows)
+        self.assertEqual((result.created, result.failed), (1, 10))
+        self.assertEqual(
+            [error['line'] for error in result.errors],
+            [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+        )
+        self.assertEqual(Post.objects.get().text, 'Хороший пост')
+
+    def test_unknown_authors_are_created_on_request(self):
+        result = importer.import_posts(
+            ndjson({'author': 'newcomer', 'text': 'Привет'}),
+            create_authors=True,
+        )
+        self.assertEqual(result.created, 1)
+        newcomer = User.objects.get(username='newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+
+    def test_post_pass(self):
+        """Счетчики, кэш, ленты и поиск обновляются после загрузки."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts_key = counters.author_posts_key(self.author.pk)
+        group_key = counters.group_posts_key(self.group.pk)
+        for key in (counters.POSTS, posts_key, group_key):
+            counters.get_count(key)
+        scopes = [feed_cache.POSTS, feed_cache.author_scope('author'),
+                  feed_cache.group_scope('cats')]
+        generations = feed_cache.get_generations(scopes)
+        importer.import_posts(ndjson(
+            {'author': 'author', 'text': 'Котята спят', 'group': 'cats'},
+            {'author': 'author', 'text': 'Щенки играют'},
+        ))
+        self.assertEqual(counters.get_count(counters.POSTS), 2)
+        self.assertEqual(counters.get_count(posts_key), 2)
+        self.assertEqual(counters.get_count(group_key), 1)
+        for old, new in zip(generations,
+                            feed_cache.get_generations(scopes)):
+            self.assertGreater(new, old)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertEqual(search.search('котята'),
+                         list(Post.objects.filter(group=self.group)
+                              .values_list('id', flat=True)))
+
+    @override_settings(POSTS_THUMBNAIL_WORKERS=0)
+    def test_images(self):
+        name = default_storage.save('posts/small.gif',
+                                    ContentFile(SMALL_GIF))
+        importer.import_posts(ndjson(
+            {'author': 'author', 'text': 'С картинкой', 'image': name}
+        ))
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, name)
+        self.assertTrue(post.thumbnail)
+
+    def test_command(self):
+        path = f'{TEMP_MEDIA_ROOT}/posts.ndjson'
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(ndjson(
+                {'author': 'author', 'text': 'Первый'},
+                {'author': 'author', 'text': 'Второй'},
+            )))
+        out = StringIO()
+        call_command('import_posts', path, stdout=out)
+        self.assertIn('Создано постов: 2, с ошибками: 0', out.getvalue())
+        self.assertEqual(Post.objects.count(), 2)
@@ -0,0 +1,142 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import urlencode
+from posts import search
+from posts.models import Comment, Group, Post, User
+
+
+@override_settings(POSTS_SEARCH_INDEX_DELAY=0)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='test_user', first_name='Лев', last_name='Толстой'
+        )
+
+    def setUp(self):
+        self.guest_user = Client()
+        self.group = Group.objects.create(
+            title='Кошки',
+            slug='cats',
+            description='Test description',
+        )
+
+    def assertFound(self, query, posts):
+        self.assertEqual(search.search(query), [post.pk for post in posts])
+
+    def test_backend_matches_database(self):
+        """Тесты идут на SQLite с FTS5, то есть через индекс."""
+        self.assertIsInstance(search.get_backend(), search.SQLiteSearch)
+
+    def test_post_is_found_by_text_group_and_author(self):
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Котята спят'
+        )
+        for query in ('котята', 'Котят', 'кошки', 'Толстой', 'test_user'):
+            with self.subTest(query=query):
+                self.assertFound(query, [post])
+        self.assertFound('собаки', [])
+
+    def test_index_follows_changes(self):
+        """Индекс следует за постом, группой, автором и комментариями."""
+        post = Post.objects.create(author=self.author, text='Котята спят')
+        post.text = 'Щенки играют'
+        post.save()
+        self.assertFound('котята', [])
+        self.assertFound('щенки', [post])
+
+        post.group = self.group
+        post.save()
+        self.group.title = 'Собаки'
+        self.group.save()
+        self.assertFound('собаки', [post])
+        self.group.delete()
+        self.assertFound('собаки', [])
+
+        self.author.last_name = 'Чехов'
+        self.author.save()
+        self.assertFound('чехов', [post])
+
+        comment = Comment.objects.create(
+            post=post, author=self.author, text='Прелесть какая'
+        )
+        self.assertFound('прелесть', [post])
+        comment.delete()
+        self.assertFound('прелесть', [])
+
+        post.delete()
+        self.assertFound('щенки', [])
+
+    @override_settings(POSTS_SEARCH_INDEX_DELAY=1)
+    def test_comment_is_indexed_after_request(self):
+        """Комментарий попадает в индекс не в запросе, а пачкой позже."""
+        post = Post.objects.create(author=self.author, text='Котята спят')
+        client = Client()
+        client.force_login(self.author)
+        client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Прелесть какая'},
+        )
+        self.assertTrue(Comment.objects.filter(post=post).exists())
+        self.assertFound('прелесть', [])
+        search.index_posts([post.pk])
+        self.assertFound('прелесть', [post])
+
+    def test_ranking(self):
+        """Совпадение в тексте важнее совпадения в комментарии."""
+        commented = Post.objects.create(author=self.author, text='Утро')
+        Comment.objects.create(
+            post=commented, author=self.author, text='Котята проснулись'
+        )
+        matching = Post.objects.create(author=self.author, text='Котята')
+        self.assertFound('котята', [matching, commented])
+
+    def test_rebuild(self):
+        post = Post.objects.create(author=self.author, text='Котята спят')
+        search.get_backend().unindex(None)
+        self.assertFound('котята', [])
+        search.rebuild()
+        self.assertFound('котята', [post])
+
+    def test_search_page(self):
+        posts = [
+            Post.objects.create(author=self.author, text=f'Котенок #{i}')
+            for i in range(12)
+        ]
+        Post.objects.create(author=self.author, text='Щенок')
+        url = reverse('posts:post_search')
+        response = self.guest_user.get(url, {'q': 'котенок'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, len(posts))
+        self.assertEqual(len(page_obj), 10)
+        self.assertContains(
+            response, f'?{urlencode({"q": "котенок"})}&amp;page=2'
+        )
+        response = self.guest_user.get(url, {'q': 'котенок', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertEqual(
+            len(self.guest_user.get(url).context['page_obj']), 0
+        )
+
+    def test_admin_search_is_not_capped(self):
+        """Админка находит все совпадения, а не SEARCH_CANDIDATES."""
+        total = search.SEARCH_CANDIDATES + 1
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Котенок #{i}')
+            for i in range(total)
+        )
+        search.rebuild()
+        self.assertEqual(len(search.search('котенок')), total - 1)
+        self.assertEqual(
+            search.filter_posts(Post.objects.all(), 'котенок').count(), total
+        )
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'котенок'}
+        )
+        self.assertEqual(response.context['cl'].result_count, total)
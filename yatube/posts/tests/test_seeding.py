@@ -0,0 +1,52 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from django.conf import settings
+from django.test import SimpleTestCase
+
+
+# Скрипт комментирует пост во временной базе: комментарий ставит в
+# очередь переиндексацию поиска, которая не должна дойти до рабочей базы.
+SCRIPT = '''
+from posts.models import Comment, Post, User
+from posts.seeding import temporary_database
+
+with temporary_database(name={name!r}):
+    author = User.objects.create_user(username='bench')
+    post = Post.objects.create(author=author, text='Пост бенчмарка')
+    Comment.objects.create(post=post, author=author, text='Комментарий')
+'''
+
+
+class TemporaryDatabaseTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.database = os.path.join(self.directory, 'real.sqlite3')
+        shutil.copyfile(
+            os.path.join(settings.BASE_DIR, 'testdb.sqlite3'), self.database
+        )
+
+    def read(self):
+        with open(self.database, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+
+    def test_real_database_untouched(self):
+        """Фоновые задачи бенчмарка не пишут в рабочую базу."""
+        before = self.read()
+        script = SCRIPT.format(
+            name=os.path.join(self.directory, 'bench.sqlite3')
+        )
+        subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-c', script],
+            cwd=settings.BASE_DIR, check=True, capture_output=True,
+            env={
+                **os.environ,
+                'YATUBE_DATABASE_URL': f'sqlite:///{self.database}',
+            },
+        )
+        self.assertEqual(self.read(), before)
+        self.assertFalse(os.path.exists(f'{self.database}-wal'))
@@ -0,0 +1,180 @@
+import shutil
+import tempfile
+from io import StringIO
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile as suf
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post, PostImageVariant, User
+from posts.thumbnails import VARIANT_WIDTHS, make_thumbnail
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_user = Client()
+        self.auth_user = Client()
+        self.auth_user.force_login(self.author)
+        self.post = Post.objects.create(
+            author=self.author,
+            text='Test post',
+            image=suf('pic.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        self.post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}
+        )
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """Пока миниатюра готовится, вместо нее выводится заглушка."""
+        for url in (reverse('posts:index'), self.post_url):
+            with self.subTest(url=url):
+                response = self.guest_user.get(url)
+                self.assertContains(response, 'aspect-ratio: 960 / 339')
+                self.assertNotContains(response, '<img class="card-img')
+
+    def test_ready_thumbnail_is_shown(self):
+        """Готовая миниатюра сразу видна в ленте и на странице поста."""
+        self.guest_user.get(reverse('posts:index'))
+        url = make_thumbnail(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, url)
+        for page in (reverse('posts:index'), self.post_url):
+            with self.subTest(url=page):
+                self.assertContains(self.guest_user.get(page), url)
+
+    def test_image_variants_are_made(self):
+        """Для каждой ширины готовятся варианты в JPEG и WebP."""
+        make_thumbnail(self.post.pk)
+        variants = self.post.image_variants.all()
+        self.assertEqual(
+            sorted(variants.values_list('width', 'format')),
+            sorted(
+                (width, image_format)
+                for width in VARIANT_WIDTHS
+                for image_format in (
+                    PostImageVariant.JPEG, PostImageVariant.WEBP
+                )
+            )
+        )
+        for variant in variants:
+            with self.subTest(variant=variant.url):
+                self.assertEqual(
+                    variant.height, round(variant.width * 339 / 960)
+                )
+        make_thumbnail(self.post.pk)
+        self.assertEqual(
+            self.post.image_variants.count(), len(VARIANT_WIDTHS) * 2
+        )
+
+    def test_srcset_is_rendered(self):
+        """Картинка выводится с srcset и источником WebP."""
+        make_thumbnail(self.post.pk)
+        webp = self.post.image_variants.get(
+            format=PostImageVariant.WEBP, width=VARIANT_WIDTHS[0]
+        )
+        for url in (reverse('posts:index'), self.post_url):
+            with self.subTest(url=url):
+                response = self.guest_user.get(url)
+                self.assertContains(response, '<source type="image/webp"')
+                self.assertContains(
+                    response, f'{webp.url} {VARIANT_WIDTHS[0]}w'
+                )
+                self.assertContains(response, 'srcset=', count=2)
+
+    @override_settings(POSTS_THUMBNAIL_WORKERS=0)
+    def test_thumbnail_is_made_on_post_create(self):
+        """Миниатюра новой картинки готовится при создании поста."""
+        self.auth_user.post(reverse('posts:post_create'), data={
+            'text': 'New post',
+            'image': suf('new.gif', SMALL_GIF, content_type='image/gif'),
+        })
+        post = Post.objects.get(text='New post')
+        self.assertTrue(post.thumbnail)
+
+    def test_new_image_resets_thumbnail(self):
+        """После замены картинки старая миниатюра не показывается."""
+        make_thumbnail(self.post.pk)
+        self.auth_user.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={
+                'text': 'Edited',
+                'image': suf('other.gif', SMALL_GIF,
+                             content_type='image/gif'),
+            },
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, '')
+
+    @override_settings(POSTS_THUMBNAIL_WORKERS=0)
+    def test_image_changed_outside_form(self):
+        """
+        Картинка, замененная в обход формы (админка, API, shell), получает
+        новую миниатюру; сохранение без замены миниатюру не трогает.
+        """
+        make_thumbnail(self.post.pk)
+        self.post.refresh_from_db()
+        old_thumbnail = self.post.thumbnail
+        self.post.text = 'Edited'
+        self.post.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, old_thumbnail)
+        self.post.image = suf('other.gif', SMALL_GIF,
+                              content_type='image/gif')
+        self.post.save()
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnail)
+        self.assertNotEqual(self.post.thumbnail, old_thumbnail)
+
+    def test_warm_thumbnails_command(self):
+        """Команда warm_thumbnails готовит недостающие миниатюры."""
+        out = StringIO()
+        call_command('warm_thumbnails', '--processes', '1', stdout=out)
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnail)
+        self.assertIn('Готово: 1, ошибок: 0', out.getvalue())
+        out = StringIO()
+        call_command('warm_thumbnails', '--processes', '1', stdout=out)
+        self.assertIn('Все миниатюры уже готовы.', out.getvalue())
+
+    def test_warm_thumbnails_logs_failures(self):
+        """Ошибка подготовки миниатюры пишется в журнал с id поста."""
+        Post.objects.filter(pk=self.post.pk).update(image='posts/missing.gif')
+        out = StringIO()
+        # sorl-thumbnail сам пишет в журнал, что файла нет.
+        with self.assertLogs('sorl.thumbnail', 'ERROR'), self.assertLogs(
+                'posts.management.commands.warm_thumbnails') as logs:
+            call_command('warm_thumbnails', '--processes', '1', stdout=out)
+        self.assertIn(f'поста {self.post.pk}', logs.output[0])
+        self.assertIn('Готово: 0, ошибок: 1', out.getvalue())
+
+    def test_warm_thumbnails_checks_arguments(self):
+        """Число процессов и размер порции — хотя бы 1."""
+        for option in ('--processes', '--chunk-size'):
+            with self.subTest(option=option):
+                with self.assertRaises(CommandError):
+                    call_command('warm_thumbnails', option, '0')
@@ -1,4 +1,5 @@
 from http import HTTPStatus
+from django.core.cache import cache
 from django.test import TestCase, Client
 from posts.models import Post, Group, User
 
@@ -20,6 +21,7 @@ class PostUrlsTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_user = Client()
 
         self.user = PostUrlsTests.author
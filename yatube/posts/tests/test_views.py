@@ -1,12 +1,17 @@
 import shutil
 import tempfile
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile as suf
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django import forms
-from posts.models import Post, Group, Comment, User
-from posts.views import SHOWN_POSTS_NUMBER, SHOWN_TITLE_CHAR_COUNT
+from core.querywatch import RAISE
+from posts.models import Post, Group, Comment, Counter, User
+from posts.paginators import CURSOR
+from posts.views import (
+    SHOWN_COMMENTS_NUMBER, SHOWN_POSTS_NUMBER, SHOWN_TITLE_CHAR_COUNT,
+)
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -18,11 +23,21 @@ GROUP_LIST: str = 'posts:group_list'
 PROFILE: str = 'posts:profile'
 POST_DETAIL: str = 'posts:post_detail'
 POST_EDIT: str = 'posts:post_edit'
+POST_COMMENTS: str = 'posts:post_comments'
 
 END_PAGE_POSTS_COUNT: int = 3
 
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, QUERYWATCH_MODE=RAISE)
 class PostViewsTests(TestCase):
 
     @classmethod
@@ -65,6 +80,7 @@ class PostViewsTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_user = Client()
 
         self.user = PostViewsTests.author
@@ -287,6 +303,7 @@ class PostViewsTests(TestCase):
         self.assertIsNotNone(response.image)
 
 
+@override_settings(QUERYWATCH_MODE=RAISE)
 class PaginatorTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -306,6 +323,7 @@ class PaginatorTests(TestCase):
         ])
 
     def setUp(self):
+        cache.clear()
         self.auth_user = Client()
         self.user = User.objects.create_user(username='auth')
         self.auth_user.force_login(self.author)
@@ -332,3 +350,516 @@ class PaginatorTests(TestCase):
                 response = self.auth_user.get(view + '?page=2')
                 self.assertEqual(len(response.context['page_obj']),
                                  END_PAGE_POSTS_COUNT)
+
+
+@override_settings(POSTS_PAGINATION={
+    'index': CURSOR,
+    'group_posts': CURSOR,
+    'profile': CURSOR,
+})
+class CursorPaginatorTests(PaginatorTests):
+    def test_index_last_page_contains_two_records(self):
+        """По курсору следующей страницы отображается 3 поста"""
+        for view in self.views:
+            with self.subTest(view=view):
+                first_page = self.auth_user.get(view).context['page_obj']
+                response = self.auth_user.get(
+                    view, {'after': first_page.next_cursor}
+                )
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), END_PAGE_POSTS_COUNT)
+                self.assertFalse(page_obj.has_next())
+                self.assertTrue(page_obj.has_previous())
+
+    def test_previous_cursor_returns_first_page(self):
+        """Курсор предыдущей страницы возвращает первую страницу"""
+        for view in self.views:
+            with self.subTest(view=view):
+                first_page = self.auth_user.get(view).context['page_obj']
+                last_page = self.auth_user.get(
+                    view, {'after': first_page.next_cursor}
+                ).context['page_obj']
+                page_obj = self.auth_user.get(
+                    view, {'before': last_page.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(page_obj), list(first_page))
+                self.assertFalse(page_obj.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор не ломает страницу"""
+        response = self.auth_user.get(reverse(INDEX), {'after': 'broken'})
+        self.assertEqual(len(response.context['page_obj']),
+                         SHOWN_POSTS_NUMBER)
+
+
+@override_settings(QUERYWATCH_MODE=RAISE)
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        cls.post = Post.objects.create(author=cls.author, text='Test post')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_user = Client()
+        for i in range(SHOWN_COMMENTS_NUMBER + 5):
+            Comment.objects.create(
+                post=self.post,
+                author=User.objects.create_user(username=f'commenter_{i}'),
+                text=f'Comment #{i}',
+            )
+        self.comments = list(self.post.comments.order_by('created', 'id'))
+
+    def test_post_detail_shows_first_comments(self):
+        """На странице поста выводится первая страница комментариев."""
+        response = self.guest_user.get(
+            reverse(POST_DETAIL, kwargs={'post_id': self.post.id})
+        )
+        page = response.context['comments']
+        self.assertEqual(list(page), self.comments[:SHOWN_COMMENTS_NUMBER])
+        self.assertContains(
+            response,
+            reverse(POST_COMMENTS, kwargs={'post_id': self.post.id})
+            + f'?after={page.next_cursor}'
+        )
+
+    def test_comments_fragment(self):
+        """Следующие комментарии отдаются HTML-фрагментом и JSON."""
+        url = reverse(POST_COMMENTS, kwargs={'post_id': self.post.id})
+        first_page = self.guest_user.get(url).context['comments']
+        response = self.guest_user.get(
+            url, {'after': first_page.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertNotContains(response, '<html')
+        self.assertEqual(
+            list(response.context['comments']),
+            self.comments[SHOWN_COMMENTS_NUMBER:]
+        )
+        data = self.guest_user.get(
+            url, {'after': first_page.next_cursor, 'format': 'json'}
+        ).json()
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.pk for comment in self.comments[SHOWN_COMMENTS_NUMBER:]]
+        )
+        self.assertEqual(data['comments'][0]['author'], 'commenter_20')
+        self.assertIsNone(data['next_cursor'])
+
+    def test_comments_query_budget(self):
+        """Авторы комментариев загружаются тем же запросом."""
+        url = reverse(POST_COMMENTS, kwargs={'post_id': self.post.id})
+        with self.assertNumQueries(2):
+            self.guest_user.get(url)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, QUERYWATCH_MODE=RAISE)
+class PostDetailQueryBudgetTests(TestCase):
+    """Страница поста укладывается в бюджет запросов."""
+    # Автор поста для ключа кэша и ETag, пост с автором, группой
+    # и счетчиком, варианты картинки и комментарии с авторами.
+    GUEST_BUDGET: int = 4
+    # Еще сессия и пользователь: страница не берется из кэша целиком.
+    AUTH_BUDGET: int = 6
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='Test group',
+            slug='test_slug',
+            description='Test description',
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_user = Client()
+        self.auth_user = Client()
+        self.auth_user.force_login(self.author)
+        self.post = Post.objects.create(
+            author=self.author,
+            group=self.group,
+            text='Test post',
+            image=suf('pic.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        self.url = reverse(POST_DETAIL, kwargs={'post_id': self.post.id})
+
+    def test_post_detail_fits_query_budget(self):
+        """Число запросов не зависит от числа комментариев."""
+        for comments_count in (0, SHOWN_COMMENTS_NUMBER * 2):
+            for i in range(comments_count):
+                Comment.objects.create(
+                    post=self.post,
+                    author=User.objects.create_user(username=f'user_{i}'),
+                    text=f'Comment #{i}',
+                )
+            self.guest_user.get(self.url)
+            for client, budget in ((self.guest_user, self.GUEST_BUDGET),
+                                   (self.auth_user, self.AUTH_BUDGET)):
+                with self.subTest(comments_count=comments_count,
+                                  budget=budget):
+                    cache.clear()
+                    with self.assertNumQueries(budget):
+                        response = client.get(self.url)
+                    self.assertEqual(response.context['posts_count'], 1)
+
+    def test_missing_counter_is_computed(self):
+        """Без счетчика число постов автора считается отдельно."""
+        Counter.objects.all().delete()
+        response = self.guest_user.get(self.url)
+        self.assertEqual(response.context['posts_count'], 1)
+
+
+@override_settings(QUERYWATCH_MODE=RAISE)
+class FeedQueryBudgetTests(TestCase):
+    """Число запросов ленты не зависит от количества постов на странице."""
+    QUERY_BUDGETS = {
+        INDEX: 3,
+        GROUP_LIST: 4,
+        PROFILE: 4,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='budget_author')
+        cls.group = Group.objects.create(
+            title='Budget group',
+            slug='budget_slug',
+            description='Budget description',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_user = Client()
+
+    def create_posts(self, count):
+        for i in range(count):
+            author = User.objects.create_user(username=f'author_{i}')
+            Post.objects.create(
+                author=author if i % 2 else self.author,
+                group=self.group,
+                text=f'Budget post #{i}',
+            )
+
+    def get_urls(self):
+        return {
+            INDEX: reverse(INDEX),
+            GROUP_LIST: reverse(GROUP_LIST,
+                                kwargs={'slug': self.group.slug}),
+            PROFILE: reverse(PROFILE,
+                             kwargs={'username': self.author}),
+        }
+
+    def test_feed_views_fit_query_budget(self):
+        """Лента укладывается в бюджет запросов при любом размере."""
+        for posts_count in (1, SHOWN_POSTS_NUMBER * 2):
+            self.create_posts(posts_count)
+            for view, url in self.get_urls().items():
+                self.guest_user.get(url)
+                with self.subTest(view=view, posts_count=posts_count):
+                    cache.clear()
+                    with self.assertNumQueries(self.QUERY_BUDGETS[view]):
+                        self.guest_user.get(url)
+            Post.objects.all().delete()
+            User.objects.exclude(pk=self.author.pk).delete()
+
+
+@override_settings(QUERYWATCH_MODE=RAISE)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Test group',
+            slug='test_slug',
+            description='Test description',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_user = Client()
+        self.auth_user = Client()
+        self.auth_user.force_login(self.reader)
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Test post'
+        )
+        self.urls = [
+            reverse(INDEX),
+            reverse(GROUP_LIST, kwargs={'slug': self.group.slug}),
+            reverse(PROFILE, kwargs={'username': self.author}),
+            reverse(POST_DETAIL, kwargs={'post_id': self.post.id}),
+        ]
+
+    def test_unchanged_page_is_not_modified(self):
+        """Неизмененная страница отдается ответом 304 без отрисовки."""
+        for url in self.urls:
+            for client in (self.guest_user, self.auth_user):
+                with self.subTest(url=url, client=client):
+                    response = client.get(url)
+                    self.assertIn('Cookie', response['Vary'])
+                    response = client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                    self.assertEqual(response.status_code, 304)
+                    self.assertIsNone(response.context)
+
+    def test_guest_needs_no_queries_for_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.guest_user.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    self.guest_user.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_users_get_own_etags(self):
+        """Гость и пользователь не получают вариант страницы друг друга."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(
+                    self.guest_user.get(url)['ETag'],
+                    self.auth_user.get(url)['ETag'],
+                )
+
+    def test_changes_reset_validators(self):
+        """Новый комментарий и подписка меняют ETag страниц."""
+        post_url, profile_url = self.urls[3], self.urls[2]
+        etags = {
+            url: self.auth_user.get(url)['ETag']
+            for url in (post_url, profile_url)
+        }
+        Comment.objects.create(
+            post=self.post, author=self.author, text='New comment'
+        )
+        self.auth_user.get(
+            reverse('posts:profile_follow', kwargs={'username': self.author})
+        )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.auth_user.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_relogin_resets_validators(self):
+        """
+        После нового входа форма с прежним токеном CSRF не отдается
+        ответом 304: комментарий из полученной страницы принимается.
+        """
+        User.objects.create_user(username='commenter', password='password')
+        client = Client(enforce_csrf_checks=True)
+        credentials = {'username': 'commenter', 'password': 'password'}
+        post_url = self.urls[3]
+
+        def login():
+            page = client.get(reverse('users:login'))
+            client.post(reverse('users:login'), {
+                **credentials,
+                'csrfmiddlewaretoken': page.context['csrf_token'],
+            })
+
+        login()
+        etag = client.get(post_url)['ETag']
+        client.get(reverse('users:logout'))
+        login()
+        response = client.get(post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = client.post(
+            reverse(ADD_COMMENT, kwargs={'post_id': self.post.id}),
+            {'text': 'Comment',
+             'csrfmiddlewaretoken': response.context['csrf_token']},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Comment.objects.filter(text='Comment').exists())
+
+
+@override_settings(QUERYWATCH_MODE=RAISE)
+class IndexCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='Test group',
+            slug='test_slug',
+            description='Test description',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_user = self.client_class()
+        self.auth_user = self.client_class()
+        self.auth_user.force_login(self.author)
+        self.post = Post.objects.create(author=self.author, text='Cached')
+
+    def test_index_is_cached_for_guest_user(self):
+        """Повторный запрос главной страницы отдается из кэша."""
+        content = self.guest_user.get(reverse(INDEX)).content
+        with self.assertNumQueries(0):
+            response = self.guest_user.get(reverse(INDEX))
+        self.assertEqual(response.content, content)
+
+    def test_index_cache_is_reset_by_changes(self):
+        """После изменений постов и групп главная страница пересобирается."""
+        changes = {
+            'new post': lambda: Post.objects.create(
+                author=self.author, text='Fresh post'),
+            'edited post': lambda: Post.objects.get(pk=self.post.pk).save(),
+            'group': lambda: self.group.save(),
+            'deleted post': lambda: self.post.delete(),
+        }
+        for change, apply_change in changes.items():
+            with self.subTest(change=change):
+                self.guest_user.get(reverse(INDEX))
+                apply_change()
+                response = self.guest_user.get(reverse(INDEX))
+                self.assertIsNotNone(response.context)
+
+    def test_new_post_is_visible_on_cached_index(self):
+        """Новый пост сразу виден на закэшированной главной странице."""
+        self.guest_user.get(reverse(INDEX))
+        Post.objects.create(author=self.author, text='Fresh post')
+        response = self.guest_user.get(reverse(INDEX))
+        self.assertContains(response, 'Fresh post')
+
+    def test_index_is_not_cached_for_auth_user(self):
+        """Страница авторизованного пользователя не берется из кэша."""
+        self.auth_user.get(reverse(INDEX))
+        response = self.auth_user.get(reverse(INDEX))
+        self.assertIsNotNone(response.context)
+
+
+@override_settings(QUERYWATCH_MODE=RAISE)
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Test group',
+            slug='test_slug',
+            description='Test description',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_user = self.client_class()
+        self.auth_user = self.client_class()
+        self.auth_user.force_login(self.reader)
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Cached post'
+        )
+        self.urls = [
+            reverse(GROUP_LIST, kwargs={'slug': self.group.slug}),
+            reverse(PROFILE, kwargs={'username': self.author}),
+            reverse(POST_DETAIL, kwargs={'post_id': self.post.id}),
+        ]
+
+    def test_pages_are_cached_for_guest_user(self):
+        """Повторный запрос страницы гостем отдается из кэша."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                content = self.guest_user.get(url).content
+                with self.assertNumQueries(0):
+                    response = self.guest_user.get(url)
+                self.assertEqual(response.content, content)
+
+    def test_auth_pages_reuse_cached_fragments(self):
+        """Страница авторизованного пользователя собирается из кэша."""
+        fragment_templates = {
+            self.urls[0]: 'posts/includes/post_card.html',
+            self.urls[1]: 'posts/includes/post_card.html',
+            self.urls[2]: 'posts/includes/comments.html',
+        }
+        for url, template in fragment_templates.items():
+            with self.subTest(url=url):
+                self.auth_user.get(url)
+                response = self.auth_user.get(url)
+                self.assertContains(response, 'Cached post')
+                self.assertTemplateNotUsed(response, template)
+
+    def test_auth_post_detail_has_own_comment_form(self):
+        """Форма комментария не берется из кэша другого пользователя."""
+        url = reverse(POST_DETAIL, kwargs={'post_id': self.post.id})
+        self.guest_user.get(url)
+        response = self.auth_user.get(url)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_new_comment_is_visible_on_cached_post_detail(self):
+        """Новый комментарий сразу виден на закэшированной странице."""
+        url = reverse(POST_DETAIL, kwargs={'post_id': self.post.id})
+        for client in (self.guest_user, self.auth_user):
+            client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Fresh comment'
+        )
+        for client in (self.guest_user, self.auth_user):
+            with self.subTest(client=client):
+                self.assertContains(client.get(url), 'Fresh comment')
+
+    def test_new_post_resets_author_post_detail(self):
+        """Новый пост автора обновляет счетчик на странице его постов."""
+        url = reverse(POST_DETAIL, kwargs={'post_id': self.post.id})
+        self.guest_user.get(url)
+        Post.objects.create(author=self.author, text='Another post')
+        response = self.guest_user.get(url)
+        self.assertEqual(response.context['posts_count'], 2)
+
+
+@override_settings(QUERYWATCH_MODE=RAISE)
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='Test group',
+            slug='test_slug',
+            description='Test description',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_user = Client()
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Card text'
+        )
+
+    def test_post_card_is_shared_between_feeds(self):
+        """Карточка поста из главной страницы используется в ленте группы."""
+        self.guest_user.get(reverse(INDEX))
+        Post.objects.filter(pk=self.post.pk).update(text='Changed text')
+        response = self.guest_user.get(
+            reverse(GROUP_LIST, kwargs={'slug': self.group.slug})
+        )
+        self.assertContains(response, 'Card text')
+
+    def test_edited_post_card_is_rendered_again(self):
+        """После правки поста карточка отрисовывается заново."""
+        self.guest_user.get(reverse(INDEX))
+        self.post.text = 'Changed text'
+        self.post.save()
+        response = self.guest_user.get(
+            reverse(GROUP_LIST, kwargs={'slug': self.group.slug})
+        )
+        self.assertContains(response, 'Changed text')
+
+    def test_renamed_author_card_is_rendered_again(self):
+        """После смены имени автора карточка ссылается на новый профиль."""
+        self.guest_user.get(reverse(INDEX))
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'renamed_user'
+        author.save()
+        response = self.guest_user.get(
+            reverse(GROUP_LIST, kwargs={'slug': self.group.slug})
+        )
+        self.assertContains(
+            response, reverse(PROFILE, kwargs={'username': 'renamed_user'})
+        )
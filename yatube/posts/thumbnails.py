@@ -0,0 +1,103 @@
+"""
+Миниатюры картинок постов.
+
+Миниатюры готовятся в пуле потоков после сохранения поста, а шаблоны
+берут готовый адрес из Post.thumbnail и не обращаются к sorl-thumbnail
+во время отрисовки. Пока миниатюра не готова, выводится заглушка.
+
+Кроме основной миниатюры готовятся варианты нескольких ширин в JPEG и
+WebP (PostImageVariant), из которых шаблон собирает srcset.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+
+from core import metrics
+
+from . import background, feed_cache
+from .models import Post, PostImageVariant
+
+
+THUMBNAIL_WIDTH: int = 960
+THUMBNAIL_HEIGHT: int = 339
+THUMBNAIL_GEOMETRY: str = f'{THUMBNAIL_WIDTH}x{THUMBNAIL_HEIGHT}'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+VARIANT_WIDTHS = (320, 640, 960)
+VARIANT_FORMATS = (PostImageVariant.JPEG, PostImageVariant.WEBP)
+
+logger = logging.getLogger(__name__)
+
+
+def make_variants(post):
+    """Варианты картинки поста всех ширин и форматов, еще не сохраненные."""
+    variants = []
+    for width in VARIANT_WIDTHS:
+        height = round(width * THUMBNAIL_HEIGHT / THUMBNAIL_WIDTH)
+        for image_format in VARIANT_FORMATS:
+            thumbnail = get_thumbnail(
+                post.image, f'{width}x{height}',
+                format=image_format, **THUMBNAIL_OPTIONS
+            )
+            variants.append(PostImageVariant(
+                post=post,
+                format=image_format,
+                width=thumbnail.width,
+                height=thumbnail.height,
+                url=thumbnail.url,
+            ))
+    return variants
+
+
+def make_thumbnail(post_id):
+    """
+    Готовит миниатюру и варианты картинки поста и сохраняет их адреса.
+    Если картинку успели заменить, результат отбрасывается.
+    """
+    post = (
+        Post.objects.select_related('author', 'group')
+        .filter(pk=post_id).first()
+    )
+    if post is None or not post.image:
+        return None
+    with metrics.timed('thumbnail', metrics.THUMBNAIL_SECONDS):
+        thumbnail = get_thumbnail(
+            post.image, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS
+        )
+        variants = make_variants(post)
+    with transaction.atomic():
+        updated = Post.objects.filter(
+            pk=post_id, image=post.image.name
+        ).update(thumbnail=thumbnail.url, updated=timezone.now())
+        if updated:
+            post.image_variants.all().delete()
+            PostImageVariant.objects.bulk_create(variants)
+    if updated:
+        feed_cache.bump_generations(*feed_cache.post_scopes(post))
+    return thumbnail.url
+
+
+def _run(post_id):
+    try:
+        make_thumbnail(post_id)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюру поста %s', post_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_thumbnail(post):
+    """
+    Ставит подготовку миниатюры в очередь после фиксации транзакции.
+    При POSTS_THUMBNAIL_WORKERS = 0 миниатюра готовится сразу.
+    """
+    if settings.POSTS_THUMBNAIL_WORKERS:
+        transaction.on_commit(
+            lambda: background.get_executor(
+                'thumbnails', settings.POSTS_THUMBNAIL_WORKERS
+            ).submit(_run, post.pk)
+        )
+    else:
+        make_thumbnail(post.pk)
@@ -0,0 +1,199 @@
+"""
+Личные ленты подписчиков.
+
+Пост раскладывается по лентам подписчиков автора при публикации
+(fan-out on write): на каждого подписчика пишется строка TimelineEntry,
+и лента читается одним диапазоном индекса timeline_user_pub_date_idx.
+
+Публикация поста автора, у которого подписчиков больше
+POSTS_TIMELINE_PUSH_MAX_FOLLOWERS, стоила бы строки на каждого из них,
+поэтому такие посты не раскладываются, а подмешиваются при чтении ленты
+из индекса постов автора (fan-out on read).
+
+Когда после отписки посты автора снова раскладываются, ленты остальных
+подписчиков дополняются одним INSERT ... SELECT в фоновом потоке после
+фиксации транзакции, а не в запросе отписки. Пока дополнение не
+закончилось, в этих лентах может не хватать постов автора, вышедших
+без раскладки.
+"""
+import logging
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from . import background, counters
+from .models import Counter, Follow, Post, TimelineEntry
+from .paginators import TimelinePaginator
+
+
+BATCH_SIZE: int = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def _insert(entries):
+    """Пишет записи пачками; уже разложенные посты пропускаются."""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _is_pushed(followers_count):
+    return followers_count <= settings.POSTS_TIMELINE_PUSH_MAX_FOLLOWERS
+
+
+def is_pushed(author_id):
+    """Раскладываются ли посты автора по лентам при публикации."""
+    return _is_pushed(
+        counters.get_count(counters.author_followers_key(author_id))
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not is_pushed(post.author_id):
+        return
+    follower_ids = (
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      pub_date=post.pub_date)
+        for user_id in follower_ids.iterator()
+    )
+
+
+def backfill_author(author_id):
+    """Добавляет все посты автора в ленты всех его подписчиков."""
+    _fan_out_where('p.author_id = %s', [author_id])
+
+
+def _run_backfill(author_id):
+    try:
+        backfill_author(author_id)
+    except Exception:
+        logger.exception(
+            'Не удалось дополнить ленты постами автора %s', author_id
+        )
+    finally:
+        connections.close_all()
+
+
+def schedule_backfill(author_id):
+    """
+    Ставит дополнение лент подписчиков автора в очередь после фиксации
+    транзакции. При POSTS_TIMELINE_BACKFILL_WORKERS = 0 ленты
+    дополняются сразу.
+    """
+    if settings.POSTS_TIMELINE_BACKFILL_WORKERS:
+        transaction.on_commit(
+            lambda: background.get_executor(
+                'timeline', settings.POSTS_TIMELINE_BACKFILL_WORKERS
+            ).submit(_run_backfill, author_id)
+        )
+    else:
+        backfill_author(author_id)
+
+
+def follow(user_id, author_id):
+    """Новая подписка: посты автора появляются в ленте подписчика."""
+    if is_pushed(author_id):
+        _fan_out_where(
+            'p.author_id = %s AND f.user_id = %s', [author_id, user_id]
+        )
+
+
+def unfollow(user_id, author_id):
+    """
+    Отписка убирает посты автора из ленты. Если после нее посты автора
+    снова раскладываются при публикации, ленты остальных подписчиков
+    дополняются в фоне постами, опубликованными без раскладки.
+    """
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+    followers_count = counters.get_count(
+        counters.author_followers_key(author_id)
+    )
+    if followers_count == settings.POSTS_TIMELINE_PUSH_MAX_FOLLOWERS:
+        schedule_backfill(author_id)
+
+
+def pull_author_ids(user):
+    """Авторы из подписок user, посты которых подмешиваются при чтении."""
+    keys = {
+        counters.author_followers_key(author_id): author_id
+        for author_id in Follow.objects.filter(user=user)
+        .values_list('author_id', flat=True)
+    }
+    if not keys:
+        return []
+    stored = dict(
+        Counter.objects.filter(key__in=keys).values_list('key', 'value')
+    )
+    return [
+        author_id for key, author_id in keys.items()
+        if not _is_pushed(
+            stored[key] if key in stored else counters.get_count(key)
+        )
+    ]
+
+
+def get_paginator(user, per_page):
+    """Постраничный вывод личной ленты user."""
+    entries = (
+        TimelineEntry.objects.filter(user=user)
+        .select_related('post__author', 'post__group')
+        .prefetch_related('post__image_variants')
+    )
+    pull_posts = None
+    pull_ids = pull_author_ids(user)
+    if pull_ids:
+        pull_posts = Post.objects.for_feed().filter(author_id__in=pull_ids)
+    return TimelinePaginator(entries, per_page, pull_posts)
+
+
+def _fan_out_where(where, params):
+    """
+    Раскладывает по лентам подписчиков посты p, подходящие под условие
+    where, одним INSERT ... SELECT. Посты авторов, которые не
+    раскладываются при публикации, пропускаются, уже разложенные тоже.
+    """
+    ops = connection.ops
+    entry_table = TimelineEntry._meta.db_table
+    follow_table = Follow._meta.db_table
+    post_table = Post._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} {entry_table} '
+            f'(user_id, post_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.pub_date FROM {follow_table} f '
+            f'JOIN {post_table} p ON p.author_id = f.author_id '
+            f'WHERE f.author_id IN ('
+            f'SELECT author_id FROM {follow_table} GROUP BY author_id '
+            f'HAVING COUNT(*) <= %s) AND {where} '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [settings.POSTS_TIMELINE_PUSH_MAX_FOLLOWERS, *params],
+        )
+
+
+def fan_out_range(first_id, last_id):
+    """
+    Раскладывает посты с id в (first_id, last_id], загруженные в обход
+    сигналов.
+    """
+    _fan_out_where('p.id > %s AND p.id <= %s', [first_id, last_id])
+
+
+def rebuild():
+    """
+    Пересобирает все ленты одним INSERT ... SELECT. Нужна после
+    загрузки подписок или постов в обход сигналов.
+    """
+    TimelineEntry.objects.all().delete()
+    _fan_out_where('1 = 1', [])
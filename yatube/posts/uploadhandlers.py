@@ -0,0 +1,179 @@
+"""
+Потоковый прием картинок постов.
+
+Обработчик пишет файл во временный файл по частям и проверяет
+ограничения, пока данные еще приходят: байты сверх
+POSTS_IMAGE_MAX_BYTES не сохраняются, а ширина и высота читаются из
+заголовка картинки, так что «бомба» с огромным числом пикселей
+отклоняется до декодирования. Принятая картинка пересохраняется без
+EXIF. JPEG декодируется сразу в уменьшенном масштабе (Image.draft),
+поэтому допускается до POSTS_IMAGE_MAX_PIXELS пикселей; PNG, GIF, WebP
+и другие форматы декодируются целиком, и для них предел меньше —
+POSTS_IMAGE_MAX_DECODED_PIXELS.
+
+Анимированные картинки (GIF, WebP, APNG) сохраняются как есть, без
+уменьшения и пересохранения: иначе от анимации остался бы первый кадр.
+Миниатюры в лентах у них все равно неподвижные. MPO с камер телефонов
+Pillow тоже считает многокадровым, но это JPEG с дополнительными
+снимками, и он пересохраняется в JPEG из первого кадра.
+
+Ошибку приема форма получает из атрибута upload_error файла.
+"""
+from functools import wraps
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps
+
+
+# Сколько начальных байтов хранить, чтобы найти в них размеры
+# картинки; у JPEG перед ними может идти EXIF до 64 КБ.
+HEADER_PEEK_BYTES: int = 256 * 1024
+JPEG_QUALITY: int = 90
+# Форматы, которые Image.draft декодирует сразу в уменьшенном масштабе.
+# Они пересохраняются в JPEG.
+DRAFT_FORMATS = ('JPEG', 'MPO')
+# Форматы, в которых несколько кадров — это анимация.
+ANIMATED_FORMATS = ('GIF', 'WEBP', 'PNG')
+
+
+def max_pixels(image_format):
+    """Сколько пикселей допускается у картинки формата image_format."""
+    if image_format in DRAFT_FORMATS:
+        return settings.POSTS_IMAGE_MAX_PIXELS
+    return min(settings.POSTS_IMAGE_MAX_PIXELS,
+               settings.POSTS_IMAGE_MAX_DECODED_PIXELS)
+
+
+def too_many_pixels_message(width, height, image_format):
+    return (
+        f'Картинка {width}×{height} слишком большая: допускается '
+        f'не больше {max_pixels(image_format)} пикселей.'
+    )
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = bytearray()
+        self.image_size = None
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.POSTS_IMAGE_MAX_BYTES:
+            self.reject(
+                'Файл больше '
+                f'{filesizeformat(settings.POSTS_IMAGE_MAX_BYTES)}.'
+            )
+            return None
+        if self.image_size is None:
+            self.peek_header(raw_data)
+            if self.error:
+                return None
+        self.file.write(raw_data)
+        return None
+
+    def peek_header(self, raw_data):
+        self.header += raw_data
+        try:
+            with Image.open(BytesIO(self.header)) as image:
+                self.image_size = image.size
+                image_format = image.format
+        except Image.DecompressionBombError:
+            self.reject(
+                'Картинка слишком большая: допускается не больше '
+                f'{settings.POSTS_IMAGE_MAX_PIXELS} пикселей.'
+            )
+            return
+        except Exception:
+            # Заголовок еще не пришел целиком.
+            if len(self.header) > HEADER_PEEK_BYTES:
+                self.reject(
+                    forms.ImageField.default_error_messages['invalid_image']
+                )
+            return
+        self.header = bytearray()
+        width, height = self.image_size
+        if width * height > max_pixels(image_format):
+            self.reject(too_many_pixels_message(width, height, image_format))
+
+    def reject(self, message):
+        self.error = message
+        self.file.seek(0)
+        self.file.truncate()
+
+    def file_complete(self, file_size):
+        if self.error:
+            self.file.upload_error = self.error
+            self.file.size = 0
+            return self.file
+        file = super().file_complete(file_size)
+        if self.image_size is None:
+            # Не картинка: ее отклонит проверка ImageField.
+            return file
+        return reencode(file)
+
+
+def reencode(file):
+    """
+    Пересохраняет картинку без метаданных: поворот из EXIF применяется
+    к пикселям, а стороны ограничиваются POSTS_IMAGE_MAX_SIDE.
+    Имя и формат файла сохраняются, анимированная картинка остается
+    как есть, а MPO становится JPEG.
+    """
+    max_side = settings.POSTS_IMAGE_MAX_SIDE
+    try:
+        with Image.open(file) as image:
+            image_format = image.format
+            if (image_format in ANIMATED_FORMATS
+                    and getattr(image, 'is_animated', False)):
+                file.seek(0)
+                return file
+            if image_format in DRAFT_FORMATS:
+                image_format = 'JPEG'
+            image.draft('RGB', (max_side, max_side))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_side, max_side))
+            if image_format == 'JPEG' and image.mode != 'RGB':
+                image = image.convert('RGB')
+            output = TemporaryUploadedFile(
+                file.name, file.content_type, 0, file.charset,
+                file.content_type_extra,
+            )
+            save_options = {'format': image_format}
+            if image_format == 'JPEG':
+                save_options.update(quality=JPEG_QUALITY, optimize=True)
+            image.save(output, **save_options)
+    except Exception:
+        # Битый файл отклонит проверка ImageField.
+        file.seek(0)
+        return file
+    file.close()
+    output.size = output.tell()
+    output.seek(0)
+    return output
+
+
+def bounded_image_upload(view):
+    """
+    Принимает файлы запроса через BoundedImageUploadHandler.
+    Обработчики можно заменить только до чтения request.POST, а его
+    читает CsrfViewMiddleware, поэтому CSRF проверяется уже внутри.
+    """
+    protected_view = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [BoundedImageUploadHandler(request)]
+        return protected_view(request, *args, **kwargs)
+    return wrapper
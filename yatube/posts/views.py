@@ -1,72 +1,167 @@
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.decorators.cache import cache_page
-from .models import Post, Group, User
+from django.utils.http import urlencode
+from .models import Comment, Follow, Post, Group, User
+from . import counters, search, timeline
+from .feed_cache import (
+    feed_page, POSTS, author_scope, group_scope, post_author_scope,
+    post_scope,
+)
 from .forms import PostForm, CommentForm
+from .paginators import COMMENT_ORDERING, CursorPaginator, get_page_obj
+from .uploadhandlers import bounded_image_upload
 
 
 SHOWN_POSTS_NUMBER: int = 10
 SHOWN_TITLE_CHAR_COUNT: int = 30
+SHOWN_COMMENTS_NUMBER: int = 20
 
 
-@cache_page(20, key_prefix='index_page')
+@feed_page(POSTS)
 def index(request):
-    posts_list = Post.objects.select_related('group')
-    paginator = Paginator(posts_list, SHOWN_POSTS_NUMBER)
-    page_num = request.GET.get('page')
-    page_obj = paginator.get_page(page_num)
+    posts_list = Post.objects.for_feed()
+    page_obj = get_page_obj(
+        request, posts_list, 'index', SHOWN_POSTS_NUMBER, counters.POSTS
+    )
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'feed_scopes': [POSTS],
     }
     return render(request, 'posts/index.html', context)
 
 
+@feed_page(group_scope('{slug}'))
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts_list = group.posts.select_related('group')
-    paginator = Paginator(posts_list, SHOWN_POSTS_NUMBER)
-    page_num = request.GET.get('page')
-    page_obj = paginator.get_page(page_num)
+    posts_list = group.posts.for_feed()
+    page_obj = get_page_obj(
+        request, posts_list, 'group_posts', SHOWN_POSTS_NUMBER,
+        counters.group_posts_key(group.pk),
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_scopes': [group_scope(group.slug)],
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@feed_page(author_scope('{username}'))
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts_list = author.posts.select_related('group')
-    paginator = Paginator(posts_list, SHOWN_POSTS_NUMBER)
-    page_num = request.GET.get('page')
-    page_obj = paginator.get_page(page_num)
-    total_posts = paginator.count
+    posts_list = author.posts.for_feed()
+    page_obj = get_page_obj(
+        request, posts_list, 'profile', SHOWN_POSTS_NUMBER,
+        counters.author_posts_key(author.pk),
+    )
+    total_posts = page_obj.paginator.count
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(user=request.user, author=author).exists()
+    )
     context = {
         'total_posts': total_posts,
+        'following': following,
         'page_obj': page_obj,
         'username': author,
+        'feed_scopes': [author_scope(author.username)],
     }
     return render(request, 'posts/profile.html', context)
 
 
+def get_comments_page(request, post_id):
+    """Страница комментариев поста по курсору из ?after= или ?before=."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    )
+    paginator = CursorPaginator(
+        comments, SHOWN_COMMENTS_NUMBER, ordering=COMMENT_ORDERING
+    )
+    return paginator.get_page(
+        request.GET.get('after'), request.GET.get('before')
+    )
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    post_ids = search.search(query) if query else []
+    page_obj = Paginator(post_ids, SHOWN_POSTS_NUMBER).get_page(
+        request.GET.get('page')
+    )
+    posts = Post.objects.for_feed().in_bulk(page_obj.object_list)
+    page_obj.object_list = [
+        posts[post_id] for post_id in page_obj.object_list
+        if post_id in posts
+    ]
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+        'is_truncated': len(post_ids) == search.SEARCH_CANDIDATES,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@feed_page(post_scope('{post_id}'), post_author_scope)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.for_feed().annotate(posts_count=counters.count_subquery(
+            counters.author_posts_key, 'author_id'
+        )),
+        pk=post_id,
+    )
     title = post.text[:SHOWN_TITLE_CHAR_COUNT]
-    posts_count = post.author.posts.count()
-    comments = post.comments.all()
+    posts_count = post.posts_count
+    if posts_count is None:
+        posts_count = counters.get_count(
+            counters.author_posts_key(post.author_id)
+        )
+    comments = get_comments_page(request, post.pk)
     form = CommentForm(request.POST or None)
     context = {
         'form': form,
         'comments': comments,
         'posts_count': posts_count,
         'post': post,
-        'title': title
+        'title': title,
+        'feed_scopes': [
+            post_scope(post.pk), author_scope(post.author.username),
+        ],
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@feed_page(post_scope('{post_id}'))
+def post_comments(request, post_id):
+    """
+    Следующие комментарии поста для подгрузки при прокрутке:
+    HTML-фрагмент, а с ?format=json — JSON.
+    """
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    comments = get_comments_page(request, post.pk)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    return render(
+        request, 'posts/includes/comments.html',
+        {'post': post, 'comments': comments},
+    )
+
+
 @login_required
+@bounded_image_upload
 def post_create(request):
     form = PostForm(request.POST or None,
                     files=request.FILES or None)
@@ -79,6 +174,7 @@ def post_create(request):
 
 
 @login_required
+@bounded_image_upload
 def post_edit(request, post_id):
     is_edit: bool = True
     post_obj = get_object_or_404(Post, pk=post_id)
@@ -108,3 +204,28 @@ def add_comment(request, post_id):
         comment.post = post
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
+
+
+@login_required
+def follow_index(request):
+    paginator = timeline.get_paginator(request.user, SHOWN_POSTS_NUMBER)
+    page_obj = paginator.get_page(
+        request.GET.get('after'), request.GET.get('before')
+    )
+    return render(request, 'posts/follow.html', {'page_obj': page_obj})
+
+
+@login_required
+def profile_follow(request, username):
+    author = get_object_or_404(User, username=username)
+    if author != request.user:
+        Follow.objects.get_or_create(user=request.user, author=author)
+    return redirect('posts:profile', username=username)
+
+
+@login_required
+def profile_unfollow(request, username):
+    Follow.objects.filter(
+        user=request.user, author__username=username
+    ).delete()
+    return redirect('posts:profile', username=username)
@@ -0,0 +1,46 @@
+// Подгружает следующие комментарии поста, когда ссылка «Показать еще»
+// появляется на экране или по нажатию на нее. Без JavaScript ссылка
+// открывает следующую страницу комментариев.
+(function () {
+  function load(link) {
+    if (link.dataset.loading) {
+      return;
+    }
+    link.dataset.loading = 'true';
+    fetch(link.dataset.fragment)
+      .then(function (response) { return response.text(); })
+      .then(function (html) {
+        var template = document.createElement('template');
+        template.innerHTML = html;
+        var next = template.content.querySelector('[data-more-comments]');
+        link.replaceWith(template.content);
+        if (next) {
+          watch(next);
+        }
+      })
+      .catch(function () { delete link.dataset.loading; });
+  }
+
+  var observer = 'IntersectionObserver' in window
+    ? new IntersectionObserver(function (entries) {
+      entries.forEach(function (entry) {
+        if (entry.isIntersecting) {
+          observer.unobserve(entry.target);
+          load(entry.target);
+        }
+      });
+    })
+    : null;
+
+  function watch(link) {
+    link.addEventListener('click', function (event) {
+      event.preventDefault();
+      load(link);
+    });
+    if (observer) {
+      observer.observe(link);
+    }
+  }
+
+  document.querySelectorAll('[data-more-comments]').forEach(watch);
+})();
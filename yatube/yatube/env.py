@@ -0,0 +1,101 @@
+"""Разбор настроек проекта, которые задаются переменными окружения."""
+from urllib.parse import parse_qsl, unquote, urlparse
+
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+
+DATABASE_ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgres': 'django.db.backends.postgresql',
+    'postgresql': 'django.db.backends.postgresql',
+}
+POOLED_POSTGRES_ENGINE = 'core.backends.postgresql_pool'
+
+
+def cache_config(url, key_prefix='', version=1):
+    """
+    Настройка кэша по URL:
+
+    locmem://[имя]           — память процесса, у каждого воркера своя;
+    file:///путь/к/каталогу  — файлы, общие для процессов на сервере;
+    db://таблица             — таблица в базе (нужен createcachetable);
+    memcached://хост:порт[,хост:порт] — нужен python-memcached;
+    redis://хост:порт/база   — нужен django-redis.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in CACHE_BACKENDS:
+        raise ValueError(f'Неизвестный бэкенд кэша: {url}')
+    config = {
+        'BACKEND': CACHE_BACKENDS[parsed.scheme],
+        'KEY_PREFIX': key_prefix,
+        'VERSION': int(version),
+    }
+    if parsed.scheme == 'locmem':
+        config['LOCATION'] = parsed.netloc
+    elif parsed.scheme == 'file':
+        config['LOCATION'] = parsed.path
+    elif parsed.scheme == 'db':
+        config['LOCATION'] = parsed.netloc
+    elif parsed.scheme == 'memcached':
+        config['LOCATION'] = parsed.netloc.split(',')
+    else:
+        config['LOCATION'] = url
+    return config
+
+
+def database_config(url, conn_max_age=0, pool_size=0, pool_timeout=10):
+    """
+    Настройка базы по URL:
+
+    sqlite:///относительный/путь, sqlite:////абсолютный/путь
+                     — файл SQLite; без пути — база в памяти;
+    postgres://пользователь:пароль@хост:порт/база?sslmode=require
+                     — PostgreSQL, параметры запроса уходят в OPTIONS.
+
+    conn_max_age — сколько секунд держать соединение между запросами
+    (None — бессрочно). Если pool_size больше нуля, PostgreSQL работает
+    через пул соединений процесса (core/backends/postgresql_pool):
+    соединение возвращается в пул в конце каждого запроса, а поток,
+    которому соединения не хватило, ждет до pool_timeout секунд.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in DATABASE_ENGINES:
+        raise ValueError(f'Неизвестная база: {url}')
+    config = {
+        'ENGINE': DATABASE_ENGINES[parsed.scheme],
+        'CONN_MAX_AGE': conn_max_age,
+        'OPTIONS': dict(parse_qsl(parsed.query)),
+    }
+    if parsed.scheme == 'sqlite':
+        # После sqlite:// один слеш отделяет путь: sqlite:///db.sqlite3 —
+        # относительный путь, sqlite:////var/db.sqlite3 — абсолютный.
+        path = url.split('://', 1)[1].split('?', 1)[0]
+        if path.startswith('/'):
+            path = path[1:]
+        config['NAME'] = path or ':memory:'
+        config['OPTIONS'].setdefault('timeout', 20)
+        config['OPTIONS']['timeout'] = float(config['OPTIONS']['timeout'])
+        return config
+    config.update({
+        'NAME': unquote(parsed.path[1:]),
+        'USER': unquote(parsed.username or ''),
+        'PASSWORD': unquote(parsed.password or ''),
+        'HOST': parsed.hostname or '',
+        'PORT': str(parsed.port or ''),
+    })
+    if pool_size > 0:
+        # Соединение из пула не должно оставаться за потоком после
+        # запроса, иначе пул быстро опустеет.
+        config.update({
+            'ENGINE': POOLED_POSTGRES_ENGINE,
+            'CONN_MAX_AGE': 0,
+            'POOL_SIZE': pool_size,
+            'POOL_TIMEOUT': pool_timeout,
+        })
+    return config
@@ -11,6 +11,9 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
+
+from .env import cache_config, database_config
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -41,6 +44,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -50,6 +54,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryWatchMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,7 +71,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATE_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -85,11 +92,30 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# База задается URL в YATUBE_DATABASE_URL (см. yatube/env.py), по
+# умолчанию это SQLite в testdb.sqlite3. Соединение живет между
+# запросами YATUBE_DB_CONN_MAX_AGE секунд; для PostgreSQL
+# YATUBE_DB_POOL_SIZE больше нуля включает пул соединений процесса.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'testdb.sqlite3'),
-    }
+    'default': database_config(
+        os.environ.get(
+            'YATUBE_DATABASE_URL',
+            f'sqlite:///{os.path.join(BASE_DIR, "testdb.sqlite3")}',
+        ),
+        conn_max_age=int(os.environ.get('YATUBE_DB_CONN_MAX_AGE', 60)),
+        pool_size=int(os.environ.get('YATUBE_DB_POOL_SIZE', 0)),
+        pool_timeout=float(os.environ.get('YATUBE_DB_POOL_TIMEOUT', 10)),
+    ),
+}
+
+# PRAGMA каждого нового соединения SQLite (core/signals.py): WAL, чтобы
+# чтение не ждало записи, и ожидание блокировки вместо ошибки
+# «database is locked» при одновременной записи.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 2 ** 20,
 }
 
 
@@ -143,8 +169,90 @@ LOGIN_REDIRECT_URL = 'posts:index'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Режим постраничного вывода лент: 'numbered' (?page=N)
+# или 'cursor' (?after=/?before= без OFFSET и COUNT(*)).
+POSTS_PAGINATION = {
+    'index': 'numbered',
+    'group_posts': 'numbered',
+    'profile': 'numbered',
+}
+
+# Число потоков, которые готовят миниатюры картинок постов;
+# 0 — готовить миниатюру сразу в запросе.
+POSTS_THUMBNAIL_WORKERS = 2
+
+# Посты автора с большим числом подписчиков не раскладываются по их
+# личным лентам при публикации, а подмешиваются при чтении ленты
+# (см. posts/timeline.py).
+POSTS_TIMELINE_PUSH_MAX_FOLLOWERS = 1000
+# Число потоков, которые дополняют ленты, когда посты автора снова
+# начинают раскладываться; 0 — дополнять сразу в запросе отписки.
+POSTS_TIMELINE_BACKFILL_WORKERS = 1
+
+# Через сколько секунд после комментария переиндексируются посты,
+# накопленные за это время (posts/search.py); 0 — сразу в запросе.
+POSTS_SEARCH_INDEX_DELAY = 1.0
+
+# Ограничения картинок постов. Они проверяются по мере приема файла
+# (posts/uploadhandlers.py): лишние байты не сохраняются, а размеры
+# читаются из заголовка до декодирования. Принятая картинка
+# пересохраняется без EXIF и уменьшается до POSTS_IMAGE_MAX_SIDE.
+POSTS_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 50_000_000
+# JPEG декодируется в уменьшенном масштабе, остальные форматы — целиком,
+# по 4 байта на пиксель, поэтому для них предел меньше: до 64 МБ.
+POSTS_IMAGE_MAX_DECODED_PIXELS = 16_000_000
+POSTS_IMAGE_MAX_SIDE = 2560
+
+# Наибольшее тело запроса загрузки постов через API: загрузка идет
+# внутри запроса, большие файлы загружает команда import_posts.
+POSTS_IMPORT_MAX_BYTES = 5 * 1024 * 1024
+
+# Метрики запросов (core/middleware.py): заголовок Server-Timing и
+# гистограммы процесса, которые сотрудники видят на /metrics/ в формате
+# Prometheus. Гистограммы у каждого процесса свои, поэтому собирать их
+# нужно с каждого воркера.
+METRICS_ENABLED = True
+METRICS_SERVER_TIMING = True
+
+# Поиск медленных запросов и N+1 (core/querywatch.py): 'off', 'log' —
+# писать в журнал core.querywatch или 'raise' — бросать исключение
+# (так работают тесты страниц). Запрос одной формы, выполненный за
+# обработку запроса QUERYWATCH_REPEAT_THRESHOLD раз, считается N+1.
+QUERYWATCH_MODE = os.environ.get('YATUBE_QUERYWATCH_MODE', 'off')
+QUERYWATCH_REPEAT_THRESHOLD = 5
+QUERYWATCH_SLOW_QUERY_MS = 100
+# sorl-thumbnail читает свое хранилище ключей на каждый размер
+# миниатюры; в работе миниатюры готовятся в пуле, вне запросов.
+QUERYWATCH_IGNORE = ['thumbnail_kvstore']
+
+# Выборочное профилирование запросов к страницам posts
+# (core/profiling.py): запрос профилируется по заголовку
+# X-Yatube-Profile с токеном PROFILING_TOKEN или с вероятностью
+# PROFILING_SAMPLE_RATE. Стеки снимаются раз в PROFILING_INTERVAL
+# секунд и сохраняются в PROFILING_DIR по часам; команда
+# merge_profiles сводит их для flame graph. Без токена и доли
+# профилирование выключено.
+PROFILING_TOKEN = os.environ.get('YATUBE_PROFILING_TOKEN', '')
+PROFILING_SAMPLE_RATE = float(
+    os.environ.get('YATUBE_PROFILING_SAMPLE_RATE', 0)
+)
+PROFILING_NAMESPACES = ('posts',)
+PROFILING_INTERVAL = 0.005
+PROFILING_DIR = os.environ.get(
+    'YATUBE_PROFILING_DIR',
+    os.path.join(tempfile.gettempdir(), 'yatube-profiles'),
+)
+PROFILING_KEEP_HOURS = 48
+
+# Кэш задается URL в YATUBE_CACHE_URL (см. yatube/env.py). LocMemCache
+# у каждого процесса свой, поэтому при нескольких воркерах нужен общий
+# бэкенд, например file:///var/cache/yatube. Префикс и версия ключей
+# позволяют разным развертываниям делить один кэш.
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': cache_config(
+        os.environ.get('YATUBE_CACHE_URL', 'locmem://'),
+        key_prefix=os.environ.get('YATUBE_CACHE_KEY_PREFIX', 'yatube'),
+        version=os.environ.get('YATUBE_CACHE_VERSION', 1),
+    ),
 }